@@ -1,11 +1,15 @@
+import logging
 from typing import Dict, Any
 from app.settings import settings
-from app.graph.memory import get_user_context_prompt, update_user_context
+from app.graph.memory import get_user_context_prompt
+from app.graph.prefetch import schedule_user_context_update
 
 from langsmith import traceable
 
 from slack_sdk import WebClient
 
+logger = logging.getLogger(__name__)
+
 
 @traceable(name="CustomAgent")
 def send_slack_message(channel: str, text: str) -> Dict[str, Any]:
@@ -28,40 +32,26 @@ def escalate_to_human(user_id: str, summary: str) -> Dict[str, Any]:
 
 @traceable(name="CustomAgent", metadata={"agent": "CustomAgent", "tags": ["agent", "custom", "slack"]})
 def custom_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    user_id = (state.get("user_id") if isinstance(state, dict) else None) or "unknown"
-    message = (state.get("message") if isinstance(state, dict) else None) or ""
-    locale = (state.get("locale") if isinstance(state, dict) else None) or ""
-
-    # Get user context for personalized escalation
-    context_prompt = ""
-    try:
-        context_prompt = get_user_context_prompt(user_id)
-        if context_prompt:
-            print(f"📋 Custom: Using user context for {user_id}")
-            # Include user context in the escalation message for human agents
-            if "returning user" in context_prompt or "interaction_count" in context_prompt:
-                print("   👤 User has previous interactions - providing detailed context to human agent")
-    except Exception as e:
-        print(f"⚠️ Custom: Failed to get user context: {e}")
-        context_prompt = ""
-
-    # Get recent conversation context (short-term memory)
-    conversation_context = ""
-    if state.get("messages"):
-        messages = state["messages"]
-        # Get recent conversation history (last 5 exchanges)
-        recent_messages = messages[-6:-1] if len(messages) > 6 else messages[:-1] if messages else []
-        if recent_messages:
-            context_parts = []
-            for msg in recent_messages:
-                if hasattr(msg, 'type'):
-                    if msg.type == 'human':
-                        context_parts.append(f"User: {msg.content}")
-                    elif msg.type == 'ai':
-                        context_parts.append(f"Assistant: {msg.content}")
-            if context_parts:
-                conversation_context = "\n".join(context_parts)
-                print(f"📋 Custom: Using recent conversation context ({len(context_parts)} messages)")
+    if not isinstance(state, dict):
+        state = {}
+    user_id = state.get("user_id") or "unknown"
+    message = state.get("message") or ""
+    locale = state.get("locale") or ""
+
+    # Get user context for personalized escalation; the AI router already read it into
+    # state["user_context"] this turn, so only hit the memory store when it did not run
+    context_prompt = state.get("user_context")
+    if not isinstance(context_prompt, str):
+        try:
+            context_prompt = get_user_context_prompt(user_id)
+        except Exception as e:
+            logger.warning("Custom: failed to get user context: %s", e)
+            context_prompt = ""
+    if context_prompt:
+        logger.debug("Custom: using user context for %s", user_id)
+        # Include user context in the escalation message for human agents
+        if "returning user" in context_prompt or "interaction_count" in context_prompt:
+            logger.debug("Custom: user has previous interactions - providing detailed context to human agent")
 
     meta = {"agent": "CustomAgent"}
     base_meta: dict = {}
@@ -91,10 +81,11 @@ def custom_node(state: Dict[str, Any]) -> Dict[str, Any]:
     grounding = {"mode": "slack", "tools": [res], "confidence": conf}
 
     # Update user context with custom interaction
+    # (background writer, so the reply is not held up by the memory-store write)
     try:
-        update_user_context(user_id, message, "CustomAgent", answer)
+        schedule_user_context_update(user_id, message, "CustomAgent", answer)
     except Exception as e:
-        print(f"⚠️ Custom: Failed to update user context: {e}")
+        logger.warning("Custom: failed to update user context: %s", e)
 
     return {
         "answer": answer,
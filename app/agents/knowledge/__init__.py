@@ -14,7 +14,6 @@ Sub-modules:
 - context: Context processing utilities
 - llm: LLM interaction handling
 - response: Response processing and formatting
-- retrieval: Document retrieval handling
 """
 
 # Lazy imports to avoid dependency issues during development
@@ -68,12 +67,12 @@ def __getattr__(name: str):
     elif name == "get_response_processor":
         from .response import get_response_processor
         return get_response_processor
-    elif name == "RetrievalHandler":
-        from .retrieval import RetrievalHandler
-        return RetrievalHandler
-    elif name == "get_retrieval_handler":
-        from .retrieval import get_retrieval_handler
-        return get_retrieval_handler
+    elif name == "get_orchestrator":
+        from .retrieval_orchestrator import get_orchestrator
+        return get_orchestrator
+    elif name == "orchestrate_retrieval":
+        from .retrieval_orchestrator import orchestrate_retrieval
+        return orchestrate_retrieval
     else:
         raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
@@ -94,6 +93,6 @@ __all__ = [
     "get_llm_handler",
     "ResponseProcessor",
     "get_response_processor",
-    "RetrievalHandler",
-    "get_retrieval_handler",
+    "get_orchestrator",
+    "orchestrate_retrieval",
 ]
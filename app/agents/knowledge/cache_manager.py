@@ -18,15 +18,37 @@ from app.settings import settings
 logger = logging.getLogger(__name__)
 
 
+def _submit_background(func: Callable[..., Any], *args: Any) -> None:
+    """Run a maintenance step on the knowledge warm-up pool, off the request path."""
+    from app.agents.knowledge.warmup import submit_to_warmup_pool
+
+    try:
+        submit_to_warmup_pool(func, *args)
+    except RuntimeError:
+        # Pool already shut down (interpreter exit) - skip the maintenance step
+        pass
+
+
 class CacheEntry:
     """Represents a cached entry with metadata."""
 
-    def __init__(self, value: Any, ttl_seconds: float, created_at: Optional[float] = None):
+    def __init__(
+        self,
+        value: Any,
+        ttl_seconds: float,
+        created_at: Optional[float] = None,
+        idle_ttl: Optional[float] = None,
+        validator: Optional[Callable[[Any], Any]] = None,
+    ):
         self.value = value
         self.ttl_seconds = ttl_seconds
         self.created_at = created_at or time.monotonic()
         self.access_count = 0
         self.last_accessed = self.created_at
+        # Revalidate with `validator` when the entry sat unused for longer than `idle_ttl`
+        self.idle_ttl = idle_ttl
+        self.validator = validator
+        self.revalidating = False
 
     def is_expired(self) -> bool:
         """Check if the entry has expired."""
@@ -42,6 +64,24 @@ class CacheEntry:
         """Get the age of this entry in seconds."""
         return time.monotonic() - self.created_at
 
+    def needs_revalidation(self) -> bool:
+        """Check if the entry has been idle long enough to require validation."""
+        return (
+            self.validator is not None
+            and self.idle_ttl is not None
+            and not self.revalidating
+            and (time.monotonic() - self.last_accessed) > self.idle_ttl
+        )
+
+    def revalidate(self) -> bool:
+        """Run the validator; returns False if the cached value is no longer usable."""
+        try:
+            self.validator(self.value)
+            return True
+        except Exception as e:
+            logger.warning("Cached entry failed revalidation after idle period: %s", e)
+            return False
+
 
 class CacheManager:
     """
@@ -135,28 +175,71 @@ class CacheManager:
         return to_remove
 
     def _get_from_cache(self, cache: Dict[str, CacheEntry], key: str) -> Optional[Any]:
-        """Get value from cache if it exists and is not expired."""
-        entry = cache.get(key)
-        if entry and not entry.is_expired():
-            self._hits += 1
-            return entry.access()
-        elif entry:
-            # Entry exists but is expired, remove it
-            del cache[key]
+        """
+        Get value from cache if it exists and is not expired.
+
+        An entry idle past its `idle_ttl` is still served; its validator runs on
+        the warm-up pool and drops the entry if the value is no longer usable.
+        """
+        with self._lock:
+            entry = cache.get(key)
+            if entry and not entry.is_expired():
+                if entry.needs_revalidation():
+                    entry.revalidating = True
+                    _submit_background(self._revalidate, cache, key, entry)
+                self._hits += 1
+                return entry.access()
+            elif entry:
+                # Entry exists but is expired, remove it
+                del cache[key]
+
+            self._misses += 1
+            return None
+
+    def _revalidate(self, cache: Dict[str, CacheEntry], key: str, entry: CacheEntry):
+        """Background revalidation of an idle entry; a failed check evicts it."""
+        valid = entry.revalidate()
+        with self._lock:
+            entry.revalidating = False
+            if not valid and cache.get(key) is entry:
+                del cache[key]
+
+    def _set_cache(
+        self,
+        cache: Dict[str, CacheEntry],
+        key: str,
+        value: Any,
+        ttl: float,
+        max_size: int,
+        idle_ttl: Optional[float] = None,
+        validator: Optional[Callable[[Any], Any]] = None,
+    ):
+        """Set a value in cache with TTL and size management."""
+        with self._lock:
+            # Clean expired entries only when the cache is full; reads already drop stale entries
+            if key not in cache and len(cache) >= max_size:
+                self._cleanup_expired(cache)
 
-        self._misses += 1
-        return None
+            # Set new entry
+            cache[key] = CacheEntry(value, ttl, idle_ttl=idle_ttl, validator=validator)
 
-    def _set_cache(self, cache: Dict[str, CacheEntry], key: str, value: Any, ttl: float, max_size: int):
-        """Set a value in cache with TTL and size management."""
-        # Clean expired entries first
-        self._cleanup_expired(cache)
+            # Evict LRU if over size limit
+            self._evict_lru(cache, max_size)
 
-        # Set new entry
-        cache[key] = CacheEntry(value, ttl)
+    def _set_cache_many(self, cache: Dict[str, CacheEntry], items: List[Tuple[str, Any]], ttl: float, max_size: int):
+        """Set several values with a single cleanup/eviction pass."""
+        if not items:
+            return
+
+        with self._lock:
+            if len(cache) + len(items) > max_size:
+                self._cleanup_expired(cache)
+
+            now = time.monotonic()
+            for key, value in items:
+                cache[key] = CacheEntry(value, ttl, created_at=now)
 
-        # Evict LRU if over size limit
-        self._evict_lru(cache, max_size)
+            self._evict_lru(cache, max_size)
 
     # Public API methods
 
@@ -170,6 +253,11 @@ class CacheManager:
         key = hashlib.md5(text.encode()).hexdigest()
         self._set_cache(self._embedding_cache, key, embedding, self._embedding_ttl, self._embedding_cache_size)
 
+    def set_embeddings(self, items: Dict[str, List[float]]):
+        """Cache several text -> embedding pairs in one batch."""
+        entries = [(hashlib.md5(text.encode()).hexdigest(), embedding) for text, embedding in items.items()]
+        self._set_cache_many(self._embedding_cache, entries, self._embedding_ttl, self._embedding_cache_size)
+
     def get_llm_response(self, prompt: str) -> Optional[str]:
         """Get cached LLM response for prompt."""
         key = hashlib.md5(prompt.encode()).hexdigest()
@@ -180,24 +268,67 @@ class CacheManager:
         key = hashlib.md5(prompt.encode()).hexdigest()
         self._set_cache(self._llm_cache, key, response, self._llm_ttl, self._llm_cache_size)
 
+    def set_llm_responses(self, items: List[Tuple[str, str]]):
+        """Cache several (prompt, response) pairs in one batch."""
+        entries = [(hashlib.md5(prompt.encode()).hexdigest(), response) for prompt, response in items]
+        self._set_cache_many(self._llm_cache, entries, self._llm_ttl, self._llm_cache_size)
+
+    async def aset_llm_response(self, prompt: str, response: str):
+        """Async variant of set_llm_response."""
+        self.set_llm_response(prompt, response)
+
+    async def aset_llm_responses(self, items: List[Tuple[str, str]]):
+        """Async variant of set_llm_responses; the whole batch is written in one round."""
+        self.set_llm_responses(items)
+
     def get_retriever(self, name: str) -> Optional[Any]:
         """Get cached retriever by name."""
         return self._get_from_cache(self._retriever_cache, name)
 
-    def set_retriever(self, name: str, retriever: Any):
-        """Cache retriever by name."""
-        self._set_cache(self._retriever_cache, name, retriever, self._retriever_ttl, self._retriever_cache_size)
+    def set_retriever(
+        self,
+        name: str,
+        retriever: Any,
+        idle_ttl: Optional[float] = None,
+        validator: Optional[Callable[[Any], Any]] = None,
+    ):
+        """Cache retriever by name, optionally revalidating it after `idle_ttl` seconds unused."""
+        self._set_cache(
+            self._retriever_cache,
+            name,
+            retriever,
+            self._retriever_ttl,
+            self._retriever_cache_size,
+            idle_ttl=idle_ttl,
+            validator=validator,
+        )
 
     def get(self, key: str, namespace: str = "") -> Optional[Any]:
         """Get value from general cache."""
         cache_key = self._get_cache_key(key, namespace)
         return self._get_from_cache(self._general_cache, cache_key)
 
-    def set(self, key: str, value: Any, namespace: str = "", ttl: Optional[float] = None):
+    def set(
+        self,
+        key: str,
+        value: Any,
+        namespace: str = "",
+        ttl: Optional[float] = None,
+        idle_ttl: Optional[float] = None,
+        validator: Optional[Callable[[Any], Any]] = None,
+    ):
         """Set value in general cache."""
         cache_key = self._get_cache_key(key, namespace)
         ttl_value = ttl or self._general_ttl
-        self._set_cache(self._general_cache, cache_key, value, ttl_value, self._general_cache_size)
+        self._set_cache(
+            self._general_cache,
+            cache_key,
+            value,
+            ttl_value,
+            self._general_cache_size,
+            idle_ttl=idle_ttl,
+            validator=validator,
+        )
 
     def clear(self, pattern: str = "*"):
         """Clear cache entries matching pattern."""
@@ -15,6 +15,7 @@ from langsmith import traceable
 from langsmith.wrappers import wrap_openai
 
 from app.settings import settings
+from app.agents import llm_pool
 from app.tools.web_search import web_search
 from app.graph.guardrails import enforce
 from app.graph.memory import get_user_context_prompt
@@ -33,6 +34,9 @@ _context_builder = get_context_builder()
 _profiler = get_profiler()
 _warmup = get_warmup_instance()
 
+# Transcript prefix per LangChain message type; other types are left out of the prompt
+_ROLE_PREFIX = {"human": "User", "ai": "Assistant"}
+
 
 def _get_system_prompt(locale: str | None, user_id: str = None) -> str:
     """
@@ -48,9 +52,9 @@ def _get_system_prompt(locale: str | None, user_id: str = None) -> str:
         try:
             context_prompt = get_user_context_prompt(user_id)
             if context_prompt:
-                print(f"📋 KnowledgeAgent: Using user context for {user_id}")
+                logger.debug("KnowledgeAgent: using user context for %s", user_id)
         except Exception as e:
-            print(f"⚠️ KnowledgeAgent: Failed to get user context: {e}")
+            logger.warning("KnowledgeAgent: failed to get user context: %s", e)
 
     # Build system prompt with user context
     system_msg = build_system_prompt(
@@ -256,19 +260,15 @@ def knowledge_node(state: Dict[str, Any]) -> Dict[str, Any]:
             conversation_context = ""
             if state.get("messages"):
                 messages = state["messages"]
-                # Get recent conversation history (last 5 exchanges)
-                recent_messages = messages[-6:-1] if len(messages) > 6 else messages[:-1] if messages else []
-                if recent_messages:
-                    context_parts = []
-                    for msg in recent_messages:
-                        if hasattr(msg, 'type'):
-                            if msg.type == 'human':
-                                context_parts.append(f"User: {msg.content}")
-                            elif msg.type == 'ai':
-                                context_parts.append(f"Assistant: {msg.content}")
-                    if context_parts:
-                        conversation_context = "\n".join(context_parts)
-                        conversation_context = f"\n\nRECENT CONVERSATION:\n{conversation_context}"
+                # Get recent conversation history (last 5 messages before the current one)
+                context_parts = [
+                    f"{prefix}: {msg.content}"
+                    for msg in messages[-6:-1]
+                    if (prefix := _ROLE_PREFIX.get(getattr(msg, "type", None)))
+                ]
+                if context_parts:
+                    conversation_context = "\n".join(context_parts)
+                    conversation_context = f"\n\nRECENT CONVERSATION:\n{conversation_context}"
 
             prompt = f"{sys_prompt}\n\nQuestion: {question}\n\nContext:\n{combined_context}{conversation_context}"
 
@@ -283,7 +283,8 @@ def knowledge_node(state: Dict[str, Any]) -> Dict[str, Any]:
                 llm_start = time.perf_counter()
 
                 try:
-                    completion = client.chat.completions.create(
+                    completion = llm_pool.chat(
+                        client,
                         model=settings.openai_model_knowledge or settings.openai_model_fast or settings.openai_model,
                         messages=[{"role": "user", "content": prompt}],
                         temperature=0.0,
@@ -294,7 +295,8 @@ def knowledge_node(state: Dict[str, Any]) -> Dict[str, Any]:
                     # Retry logic for short responses
                     min_answer_length = getattr(settings, "min_answer_length", 40)
                     if len(final_answer.strip()) < min_answer_length:
-                        completion2 = client.chat.completions.create(
+                        completion2 = llm_pool.chat(
+                            client,
                             model=settings.openai_model_knowledge
                             or settings.openai_model_fast
                             or settings.openai_model,
@@ -8,29 +8,36 @@ Optimizes execution based on available resources and query complexity.
 import asyncio
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Tuple, Callable, Union
 import logging
 
 from app.rag.vector_retriever import VectorRAGRetriever
 from app.rag.vectorstore_milvus import MilvusVectorStore
-from app.rag.embeddings import get_embeddings
+from app.rag.embeddings import OptimizedCachedEmbeddings, get_embeddings
 from app.settings import settings
 from app.agents.knowledge.cache_manager import get_cache_manager
 from app.agents.knowledge.profiler import get_profiler, profile_step
 
 logger = logging.getLogger(__name__)
 
+# Short TTL for failed retrievals so an outage doesn't turn into a retry storm
+_NEG_CACHE_TTL = 5
 
+
+@dataclass(slots=True)
 class RetrievalResult:
     """Result of a retrieval operation."""
 
-    def __init__(self, docs: List[Any], latency_ms: float, connect_ms: float, error: Optional[str] = None):
-        self.docs = docs
-        self.latency_ms = latency_ms
-        self.connect_ms = connect_ms
-        self.error = error
-        self.success = error is None
+    docs: List[Any]
+    latency_ms: float
+    connect_ms: float
+    error: Optional[str] = None
+    success: bool = field(init=False)
+
+    def __post_init__(self):
+        self.success = self.error is None
 
 
 class AsyncRetrievalOrchestrator:
@@ -55,8 +62,20 @@ class AsyncRetrievalOrchestrator:
 
         # Performance tuning
         self._complexity_threshold = getattr(settings, "query_complexity_threshold", 10)
+        self._length_threshold = getattr(settings, "query_length_threshold", 64)
+        self._use_complexity_heuristic = getattr(settings, "use_query_complexity_heuristic", False)
         self._enable_parallel = getattr(settings, "enable_parallel_retrieval", True)
 
+        # Resolved retrievers by kind ("vector" / "faq"), reset on warmup reload
+        self._retrievers: Dict[str, Any] = {}
+        # Last use per kind; an idle retriever is re-resolved so the cache manager can revalidate it
+        self._retriever_last_used: Dict[str, float] = {}
+        self._retriever_idle_ttl = getattr(settings, "retriever_idle_ttl", 300)
+
+        # In-flight retrievals by cache key (single-flight for identical concurrent queries)
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
     def _get_thread_pool(self) -> ThreadPoolExecutor:
         """Get or create thread pool."""
         if self._thread_pool is None or self._thread_pool._shutdown:
@@ -85,51 +104,61 @@ class AsyncRetrievalOrchestrator:
         return complexity
 
     def _should_run_parallel(self, question: str) -> bool:
-        """Determine if query should run in parallel based on complexity."""
+        """Determine if query should run in parallel based on its length (or complexity, if opted in)."""
         if not self._enable_parallel:
             return False
 
-        complexity = self._analyze_query_complexity(question)
-        return complexity >= self._complexity_threshold
-
-    def _execute_vector_sync(self, question: str, vector_k: int, emb_shared: Any) -> RetrievalResult:
-        """Execute vector retrieval synchronously."""
-        start_time = time.perf_counter()
-
-        try:
-            # Check if embeddings are available
-            if not emb_shared:
-                logger.warning("Vector retrieval skipped: embeddings not available")
-                latency_ms = (time.perf_counter() - start_time) * 1000
-                return RetrievalResult([], latency_ms, 0, "embeddings_not_available")
+        if self._use_complexity_heuristic:
+            return self._analyze_query_complexity(question) >= self._complexity_threshold
 
-            # Try cache first
-            cache_key = f"vector:{question}"
-            cached_result = self._cache_manager.get(cache_key, "retrieval")
-            if cached_result:
-                return cached_result
+        # Plain length check - no per-query split/count work
+        return len(question) >= self._length_threshold
 
-            # Try pre-created lazy retriever first
-            retriever_name = "vector_retriever_lazy"
-            retriever = self._cache_manager.get_retriever(retriever_name)
-
-            connect_start = time.perf_counter()
-            if not retriever:
-                # Fallback to main retriever
-                retriever_name = "vector_main"
-                retriever = self._cache_manager.get_retriever(retriever_name)
+    def _resolve_retriever(self, kind: str, emb_shared: Any = None, k: int = 3) -> Any:
+        """Resolve a retriever via the lazy -> main -> create chain and keep it on the instance."""
+        retriever = self._cache_manager.get_retriever(f"{kind}_retriever_lazy")
+        if not retriever:
+            retriever = self._cache_manager.get_retriever(f"{kind}_main")
 
+        if not retriever:
+            # Last resort - create new retriever
+            if kind == "vector":
+                retriever = VectorRAGRetriever(embedding=emb_shared, k=k)
+            else:
+                retriever = MilvusVectorStore.connect_faq_retriever(embedding=emb_shared, k=2)
+            if retriever:
+                self._cache_manager.set_retriever(f"{kind}_main", retriever)
+
+        if retriever:
+            self._retrievers[kind] = retriever
+        return retriever
+
+    def reset_retrievers(self, kind: Optional[str] = None):
+        """Drop resolved retrievers (all, or just `kind`) so the next query picks up freshly warmed ones."""
+        if kind is None:
+            self._retrievers.clear()
+            self._retriever_last_used.clear()
+        else:
+            self._retrievers.pop(kind, None)
+            self._retriever_last_used.pop(kind, None)
+
+    def _retrieve(self, kind: str, label: str, question: str, k: int, emb_shared: Any, cache_key: str) -> RetrievalResult:
+        """Resolve the retriever, invoke it and cache the outcome."""
+        start_time = time.perf_counter()
+        try:
+            now = time.monotonic()
+            retriever = self._retrievers.get(kind)
+            if retriever is None or now - self._retriever_last_used.get(kind, now) > self._retriever_idle_ttl:
+                retriever = self._resolve_retriever(kind, emb_shared, k)
+            self._retriever_last_used[kind] = now
             if not retriever:
-                # Last resort - create new retriever
-                retriever = VectorRAGRetriever(embedding=emb_shared, k=vector_k)
-                if retriever:
-                    self._cache_manager.set_retriever(retriever_name, retriever)
-                else:
-                    logger.error("Vector retriever creation failed")
-                    latency_ms = (time.perf_counter() - start_time) * 1000
-                    return RetrievalResult([], latency_ms, 0, "retriever_creation_failed")
+                logger.error("%s retriever creation failed", label)
+                latency_ms = (time.perf_counter() - start_time) * 1000
+                result = RetrievalResult([], latency_ms, 0, "retriever_creation_failed")
+                self._cache_manager.set(cache_key, result, "retrieval", ttl=_NEG_CACHE_TTL)
+                return result
 
-            connect_ms = (time.perf_counter() - connect_start) * 1000
+            connect_ms = (time.perf_counter() - start_time) * 1000
 
             # Execute retrieval
             docs = retriever.invoke(question)
@@ -143,71 +172,89 @@ class AsyncRetrievalOrchestrator:
             return result
 
         except Exception as e:
-            error_msg = f"Vector retrieval failed: {str(e)}"
-            logger.error(error_msg)
+            logger.exception("%s retrieval failed", label)
+            error_msg = f"{label} retrieval failed: {str(e)}"
             latency_ms = (time.perf_counter() - start_time) * 1000
-            return RetrievalResult([], latency_ms, 0, error_msg)
-
-    def _execute_faq_sync(self, question: str, emb_shared: Any) -> RetrievalResult:
-        """Execute FAQ retrieval synchronously."""
-        start_time = time.perf_counter()
-
-        try:
-            # Check if embeddings are available
-            if not emb_shared:
-                logger.warning("FAQ retrieval skipped: embeddings not available")
-                latency_ms = (time.perf_counter() - start_time) * 1000
-                return RetrievalResult([], latency_ms, 0, "embeddings_not_available")
+            result = RetrievalResult([], latency_ms, 0, error_msg)
+            self._cache_manager.set(cache_key, result, "retrieval", ttl=_NEG_CACHE_TTL)
+            return result
 
-            # Try cache first
-            cache_key = f"faq:{question}"
-            cached_result = self._cache_manager.get(cache_key, "retrieval")
-            if cached_result:
-                return cached_result
+    def _retrieve_single_flight(
+        self, kind: str, label: str, question: str, k: int, emb_shared: Any, cache_key: str
+    ) -> RetrievalResult:
+        """Run a retrieval, letting concurrent identical requests wait on the one already in flight."""
+        with self._inflight_lock:
+            pending = self._inflight.get(cache_key)
+            if pending is None:
+                future: Future = Future()
+                self._inflight[cache_key] = future
 
-            # Try pre-created lazy retriever first
-            retriever_name = "faq_retriever_lazy"
-            retriever = self._cache_manager.get_retriever(retriever_name)
+        if pending is not None:
+            return pending.result()
 
-            connect_start = time.perf_counter()
-            if not retriever:
-                # Fallback to main retriever
-                retriever_name = "faq_main"
-                retriever = self._cache_manager.get_retriever(retriever_name)
+        try:
+            result = self._retrieve(kind, label, question, k, emb_shared, cache_key)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(cache_key, None)
 
-            if not retriever:
-                # Last resort - create new retriever
-                retriever = MilvusVectorStore.connect_faq_retriever(embedding=emb_shared, k=2)
-                if retriever:
-                    self._cache_manager.set_retriever(retriever_name, retriever)
-                else:
-                    logger.error("FAQ retriever creation failed")
-                    latency_ms = (time.perf_counter() - start_time) * 1000
-                    return RetrievalResult([], latency_ms, 0, "retriever_creation_failed")
+    def _execute_vector_sync(self, question: str, vector_k: int, emb_shared: Any) -> RetrievalResult:
+        """Execute vector retrieval synchronously."""
+        # Check if embeddings are available
+        if not emb_shared:
+            logger.warning("Vector retrieval skipped: embeddings not available")
+            return RetrievalResult([], 0.0, 0.0, "embeddings_not_available")
 
-            connect_ms = (time.perf_counter() - connect_start) * 1000
+        # Try cache first - cached results (including short-lived failures) carry their original latency
+        cache_key = f"vector:{question}"
+        cached_result = self._cache_manager.get(cache_key, "retrieval")
+        if cached_result:
+            return cached_result
 
-            # Execute retrieval
-            docs = retriever.invoke(question)
-            latency_ms = (time.perf_counter() - start_time) * 1000
-
-            result = RetrievalResult(docs, latency_ms, connect_ms)
+        return self._retrieve_single_flight("vector", "Vector", question, vector_k, emb_shared, cache_key)
 
-            # Cache result
-            self._cache_manager.set(cache_key, result, "retrieval", ttl=300)  # 5 min cache
+    def _execute_faq_sync(self, question: str, emb_shared: Any) -> RetrievalResult:
+        """Execute FAQ retrieval synchronously."""
+        # Check if embeddings are available
+        if not emb_shared:
+            logger.warning("FAQ retrieval skipped: embeddings not available")
+            return RetrievalResult([], 0.0, 0.0, "embeddings_not_available")
 
-            return result
+        # Try cache first - cached results (including short-lived failures) carry their original latency
+        cache_key = f"faq:{question}"
+        cached_result = self._cache_manager.get(cache_key, "retrieval")
+        if cached_result:
+            return cached_result
 
-        except Exception as e:
-            error_msg = f"FAQ retrieval failed: {str(e)}"
-            logger.error(error_msg)
-            latency_ms = (time.perf_counter() - start_time) * 1000
-            return RetrievalResult([], latency_ms, 0, error_msg)
+        return self._retrieve_single_flight("faq", "FAQ", question, 2, emb_shared, cache_key)
 
     def execute_parallel(
         self, question: str, vector_k: int = 3, emb_shared: Any = None
     ) -> Tuple[RetrievalResult, RetrievalResult]:
         """Execute vector and FAQ retrieval in parallel."""
+        # Skip the thread pool when either branch is already cached
+        vector_cached = self._cache_manager.get(f"vector:{question}", "retrieval")
+        faq_cached = self._cache_manager.get(f"faq:{question}", "retrieval")
+        if vector_cached and faq_cached:
+            return vector_cached, faq_cached
+        if vector_cached:
+            return vector_cached, self._execute_faq_sync(question, emb_shared)
+        if faq_cached:
+            return self._execute_vector_sync(question, vector_k, emb_shared), faq_cached
+
+        # Embed the question once so both branches reuse the cached vector instead of
+        # each requesting (and allocating) the same embedding concurrently
+        if isinstance(emb_shared, OptimizedCachedEmbeddings):
+            try:
+                emb_shared.embed_query(question)
+            except Exception as e:
+                logger.debug("Embedding prefetch failed, branches will embed on their own: %s", e)
+
         thread_pool = self._get_thread_pool()
 
         # Submit both tasks
@@ -264,10 +311,10 @@ class AsyncRetrievalOrchestrator:
 
             # Choose execution strategy
             if enable_vector and enable_faq and self._should_run_parallel(question):
-                logger.debug(f"Running parallel retrieval for complex query: '{question}'")
+                logger.debug("Running parallel retrieval for complex query: '%s'", question)
                 return self.execute_parallel(question, vector_k, emb_shared)
             else:
-                logger.debug(f"Running sequential retrieval for query: '{question}'")
+                logger.debug("Running sequential retrieval for query: '%s'", question)
                 return self.execute_sequential(question, vector_k, emb_shared, enable_vector, enable_faq)
 
     def get_stats(self) -> Dict[str, Any]:
@@ -275,7 +322,11 @@ class AsyncRetrievalOrchestrator:
         return {
             "max_workers": self._max_workers,
             "complexity_threshold": self._complexity_threshold,
+            "length_threshold": self._length_threshold,
+            "complexity_heuristic_enabled": self._use_complexity_heuristic,
             "parallel_enabled": self._enable_parallel,
+            "resolved_retrievers": list(self._retrievers),
+            "inflight_retrievals": len(self._inflight),
             "thread_pool_active": self._thread_pool is not None and not self._thread_pool._shutdown,
         }
 
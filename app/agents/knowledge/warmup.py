@@ -2,73 +2,332 @@
 Clean Warm-up System - Optimized for Production
 """
 
+import asyncio
+import atexit
+import functools
+import re
+import threading
 import time
 import logging
-from typing import Any, Dict, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
 
 from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Frequent product questions whose embeddings are precomputed during warm-up
+COMMON_QUERIES = (
+    "Quais são as taxas da Maquininha Smart?",
+    "What are the fees of the Maquininha Smart?",
+    "Como funciona o Pix?",
+    "How does Pix work?",
+    "Como emitir um boleto?",
+    "Como abrir uma conta digital?",
+    "Como funciona o Tap to Pay?",
+    "Como pedir o cartão?",
+    "Como solicitar um empréstimo?",
+    "Quanto custa a maquininha?",
+)
+
+# Keyword tokens deciding which retriever a first query needs most
+PRODUCT_KEYWORDS = frozenset({
+    "maquininha", "pix", "boleto", "cartão", "cartao", "conta", "pdv", "tap", "empréstimo", "emprestimo",
+})
+FAQ_KEYWORDS = frozenset({"como", "qual", "quanto", "preço", "preco", "how", "what", "price"})
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Seconds before a failed lazy warm-up of a retriever kind is attempted again
+LAZY_RETRY_COOLDOWN = 60.0
+
+# Dedicated pool for blocking warm-up steps so they don't occupy the default executor used by requests
+_WARMUP_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="kb-warmup")
+atexit.register(_WARMUP_POOL.shutdown, wait=False, cancel_futures=True)
+
 class KnowledgeWarmup:
     """Optimized warm-up system with minimal logging."""
 
     def __init__(self):
         self._is_warmed_up = False
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        # Lazy warm-up state per retriever kind ("vector" / "faq")
+        self._warmed_kinds: set = set()
+        self._connecting: set = set()
+        self._last_attempt: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _warmup_common_embeddings(self, embeddings: Any) -> int:
+        """Embed uncached common queries in a single batched call. Returns how many were cached."""
+        from app.agents.knowledge.cache_manager import get_cache_manager
+
+        if not getattr(settings, "knowledge_warmup_embeddings", True) or not hasattr(embeddings, "embed_documents"):
+            logger.debug("Skipping common-query embedding warm-up (disabled or no embeddings backend)")
+            return 0
+
+        cache_manager = get_cache_manager()
+        missing = [q for q in COMMON_QUERIES if not cache_manager.get_embedding(q)]
+        if not missing:
+            return 0
+
+        try:
+            vectors = embeddings.embed_documents(missing)
+        except Exception as e:
+            # Batch failed - fall back to per-query embedding
+            logger.debug("Batched warm-up embedding failed, falling back per query: %s", e)
+            vectors = []
+            for query in missing:
+                try:
+                    vectors.append(embeddings.embed_query(query))
+                except Exception:
+                    vectors.append(None)
+
+        to_cache = {query: vector for query, vector in zip(missing, vectors) if vector}
+        cache_manager.set_embeddings(to_cache)
+        return len(to_cache)
 
     def is_warmed_up(self) -> bool:
         """Check if warm-up is complete."""
         return self._is_warmed_up
 
+    def _mark_warmed(self, kind: str) -> None:
+        with self._lock:
+            self._warmed_kinds.add(kind)
+            self._is_warmed_up = {"vector", "faq"} <= self._warmed_kinds
+
+    def _claim_attempt(self, kind: str) -> bool:
+        """Reserve a warm-up attempt for `kind` unless one is running or failed recently."""
+        now = time.monotonic()
+        with self._lock:
+            if kind in self._warmed_kinds or kind in self._connecting:
+                return False
+            if now - self._last_attempt.get(kind, float("-inf")) < LAZY_RETRY_COOLDOWN:
+                return False
+            self._last_attempt[kind] = now
+            self._connecting.add(kind)
+            return True
+
+    def _warmup_all_background(self) -> None:
+        """Full warm-up for warmup_lazy; releases the claim so a failed run can be retried."""
+        try:
+            initialize_warmup_system()
+        finally:
+            with self._lock:
+                self._connecting.discard("all")
+
+    def warmup_lazy(self, question: str) -> None:
+        """
+        Warm up on the first queries, connecting only the retriever the question needs.
+
+        Each kind is connected at most once (failed attempts are retried after a
+        cooldown). Questions that need both kinds, or neither, start the full
+        warm-up in the background instead of blocking the request.
+        """
+        if self._is_warmed_up:
+            return
+
+        tokens = set(_TOKEN_RE.findall(question.lower()))
+        wants_vector = bool(tokens & PRODUCT_KEYWORDS)
+        wants_faq = bool(tokens & FAQ_KEYWORDS)
+        if wants_vector == wants_faq:
+            if self._claim_attempt("all"):
+                self._thread = threading.Thread(target=self._warmup_all_background, name="KnowledgeWarmup", daemon=True)
+                self._thread.start()
+            return
+
+        from app.agents.knowledge.cache_manager import get_cache_manager
+
+        kind, k = ("vector", 3) if wants_vector else ("faq", 2)
+        cache_manager = get_cache_manager()
+        if cache_manager.get_retriever(f"{kind}_retriever_lazy"):
+            self._mark_warmed(kind)
+            return
+        if not self._claim_attempt(kind):
+            return
+
+        try:
+            from app.rag.embeddings import get_embeddings
+
+            embeddings = cache_manager.get("embeddings", "system") or get_embeddings()
+            if not embeddings:
+                return
+            cache_manager.set("embeddings", embeddings, "system", ttl=3600)
+
+            retriever = _connect_and_probe(kind, k, embeddings, probe=False)
+            if retriever:
+                _cache_lazy_retriever(cache_manager, kind, retriever)
+                _reset_orchestrator(kind)
+                self._mark_warmed(kind)
+        finally:
+            with self._lock:
+                self._connecting.discard(kind)
+
+    def warmup_async(self) -> Optional[asyncio.Task]:
+        """Start the full warm-up in the background without blocking the caller."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (scripts, graph worker threads) - fall back to a daemon thread
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=initialize_warmup_system, name="KnowledgeWarmup", daemon=True)
+                self._thread.start()
+            return None
+
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(_warmup_all_async())
+        return self._task
+
+    async def shutdown(self) -> None:
+        """Cancel a still-running background warm-up."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
     def get_warmup_status(self) -> Dict[str, Any]:
         """Get warm-up status."""
+        if self._is_warmed_up:
+            status = "complete"
+        elif self._task is not None and not self._task.done():
+            status = "in_progress"
+        else:
+            status = "not_started"
         return {
-            "status": "complete" if self._is_warmed_up else "not_started",
+            "status": status,
             "is_warmed_up": self._is_warmed_up
         }
 
+@functools.cache
 def get_warmup_instance() -> KnowledgeWarmup:
-    """Get global warm-up instance."""
-    if not hasattr(get_warmup_instance, '_instance'):
-        get_warmup_instance._instance = KnowledgeWarmup()
-    return get_warmup_instance._instance
+    """Get global warm-up instance (built once on first call)."""
+    return KnowledgeWarmup()
 
-def initialize_warmup_system():
-    """Initialize the warm-up system."""
-    lazy_warmup_enabled = getattr(settings, 'knowledge_warmup_on_first_query', True)
+def _reset_orchestrator(kind: Optional[str] = None) -> None:
+    """Drop the orchestrator's resolved retriever(s) so the freshly warmed ones are used."""
+    from app.agents.knowledge.retrieval_orchestrator import get_orchestrator
+    get_orchestrator().reset_retrievers(kind)
 
-    if lazy_warmup_enabled:
+def _ping_retriever(retriever: Any) -> None:
+    """Cheap liveness probe for a cached retriever; raises if the connection is gone."""
+    retriever.invoke("ping")
+
+def _cache_lazy_retriever(cache_manager: Any, kind: str, retriever: Any) -> None:
+    """Store a warmed retriever, revalidated with a ping once it has been idle for a while."""
+    cache_manager.set_retriever(
+        f"{kind}_retriever_lazy",
+        retriever,
+        idle_ttl=getattr(settings, "retriever_idle_ttl", 300),
+        validator=_ping_retriever,
+    )
+
+def _connect_and_probe(kind: str, k: int, embeddings: Any, probe: bool = True) -> Optional[Any]:
+    """Connect a retriever and (optionally) fire a dummy query so the Milvus round-trip is paid up front."""
+    from app.rag.vectorstore_milvus import MilvusVectorStore
+
+    connect = MilvusVectorStore.connect_retriever if kind == "vector" else MilvusVectorStore.connect_faq_retriever
+    try:
+        retriever = connect(embedding=embeddings, k=k)
+    except Exception:
+        return None
+    if retriever and probe:
         try:
-            from app.rag.embeddings import get_embeddings
-            from app.agents.knowledge.cache_manager import get_cache_manager
+            retriever.invoke("warmup")
+        except Exception:
+            pass
+    return retriever
 
-            embeddings = get_embeddings()
-            if embeddings:
-                cache_manager = get_cache_manager()
-                cache_manager.set("embeddings", embeddings, "system", ttl=3600)
+def _safe_common_embeddings(embeddings: Any) -> int:
+    """Common-query embedding step that never raises (a failure must not cancel sibling tasks)."""
+    try:
+        return get_warmup_instance()._warmup_common_embeddings(embeddings)
+    except Exception:
+        return 0
 
-                from app.rag.vectorstore_milvus import MilvusVectorStore
+def submit_to_warmup_pool(func: Callable[..., Any], *args: Any) -> Future:
+    """Run a blocking background step (warm-up, cache revalidation) on the warm-up pool."""
+    return _WARMUP_POOL.submit(func, *args)
 
-                try:
-                    vector_retriever = MilvusVectorStore.connect_retriever(embedding=embeddings, k=3)
-                    if vector_retriever:
-                        cache_manager.set_retriever("vector_retriever_lazy", vector_retriever)
-                except Exception:
-                    pass
+async def _in_warmup_pool(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a blocking warm-up step on the dedicated warm-up pool."""
+    return await asyncio.get_running_loop().run_in_executor(_WARMUP_POOL, func, *args)
 
-                try:
-                    faq_retriever = MilvusVectorStore.connect_faq_retriever(embedding=embeddings, k=2)
-                    if faq_retriever:
-                        cache_manager.set_retriever("faq_retriever_lazy", faq_retriever)
-                except Exception:
-                    pass
+async def _warmup_all(embeddings: Any) -> Tuple[Optional[Any], Optional[Any]]:
+    """Run the independent network-bound warm-up steps concurrently."""
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(_in_warmup_pool(_safe_common_embeddings, embeddings))
+        vector_task = tg.create_task(_in_warmup_pool(_connect_and_probe, "vector", 3, embeddings))
+        faq_task = tg.create_task(_in_warmup_pool(_connect_and_probe, "faq", 2, embeddings))
+    return vector_task.result(), faq_task.result()
+
+def _run_warmup_tasks(embeddings: Any) -> Tuple[Optional[Any], Optional[Any]]:
+    """Run the warm-up tasks, returning (vector_retriever, faq_retriever)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_warmup_all(embeddings))
+
+    # Called from inside an event loop (e.g. FastAPI startup) - run on a helper thread
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, _warmup_all(embeddings)).result()
+
+def _load_embeddings() -> Optional[Any]:
+    """Load embeddings and share them through the cache manager."""
+    from app.rag.embeddings import get_embeddings
+    from app.agents.knowledge.cache_manager import get_cache_manager
+
+    embeddings = get_embeddings()
+    if embeddings:
+        get_cache_manager().set("embeddings", embeddings, "system", ttl=3600)
+    return embeddings
+
+def _store_warmed_retrievers(vector_retriever: Optional[Any], faq_retriever: Optional[Any]) -> None:
+    """Cache warmed retrievers and mark the warm-up complete."""
+    from app.agents.knowledge.cache_manager import get_cache_manager
 
-                warmup = get_warmup_instance()
-                warmup._is_warmed_up = True
+    cache_manager = get_cache_manager()
+    if vector_retriever:
+        _cache_lazy_retriever(cache_manager, "vector", vector_retriever)
+    if faq_retriever:
+        _cache_lazy_retriever(cache_manager, "faq", faq_retriever)
+
+    # Make the orchestrator re-resolve against the fresh retrievers
+    _reset_orchestrator()
+
+    warmup = get_warmup_instance()
+    for kind, retriever in (("vector", vector_retriever), ("faq", faq_retriever)):
+        if retriever:
+            warmup._mark_warmed(kind)
+
+async def _warmup_all_async() -> None:
+    """Full warm-up on the running event loop; blocking steps run in worker threads."""
+    try:
+        embeddings = await _in_warmup_pool(_load_embeddings)
+        if embeddings:
+            _store_warmed_retrievers(*await _warmup_all(embeddings))
+    except Exception as e:
+        logger.warning("Background warm-up failed: %s", e)
+
+def initialize_warmup_system():
+    """Initialize the warm-up system."""
+    lazy_warmup_enabled = getattr(settings, 'knowledge_warmup_on_first_query', True)
+
+    if lazy_warmup_enabled:
+        try:
+            embeddings = _load_embeddings()
+            if embeddings:
+                # Embeddings are the only dependency; everything else fans out at once
+                _store_warmed_retrievers(*_run_warmup_tasks(embeddings))
 
         except Exception:
             pass
 
+def check_warmup_status() -> Dict[str, Any]:
+    """Get the global warm-up status."""
+    return get_warmup_instance().get_warmup_status()
+
 def _execute_zilliz_warmup_queries(embeddings):
     """Execute single dummy query to warm up Zilliz/Milvus database."""
     if not embeddings:
@@ -89,11 +348,3 @@ def _execute_zilliz_warmup_queries(embeddings):
     finally:
         # Restore tracing
         os.environ['LANGSMITH_TRACING'] = 'true'
-
-# Initialize on import if enabled
-lazy_warmup_enabled = getattr(settings, 'knowledge_warmup_on_first_query', True)
-if lazy_warmup_enabled:
-    try:
-        initialize_warmup_system()
-    except Exception:
-        pass
@@ -0,0 +1,56 @@
+import logging
+import random
+import threading
+import time
+from typing import Any
+
+from openai import RateLimitError
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Process-wide cap on in-flight chat completions, shared by every agent's worker thread
+_semaphore: threading.BoundedSemaphore | None = None
+_semaphore_lock = threading.Lock()
+
+# Retry policy for 429s: exponential backoff with jitter
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+
+def _get_semaphore() -> threading.BoundedSemaphore:
+    global _semaphore
+    if _semaphore is None:
+        with _semaphore_lock:
+            if _semaphore is None:
+                _semaphore = threading.BoundedSemaphore(max(1, settings.openai_concurrency or 8))
+    return _semaphore
+
+
+def _backoff_delay(attempt: int) -> float:
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) * (0.5 + random.random() / 2)
+
+
+def chat(client: Any, **kwargs):
+    """
+    Run `client.chat.completions.create(**kwargs)` under the shared limits.
+
+    At most OPENAI_CONCURRENCY completions are in flight at once across the
+    router, personality and knowledge agents; rate-limited calls are retried
+    with exponential backoff.
+    """
+    attempt = 0
+    while True:
+        with _get_semaphore():
+            try:
+                return client.chat.completions.create(**kwargs)
+            except RateLimitError:
+                if attempt >= MAX_RETRIES:
+                    raise
+        # Back off outside the semaphore so waiting retries don't hold a permit
+        delay = _backoff_delay(attempt)
+        logger.info("llm_pool: rate limited, retrying in %.2fs", delay)
+        time.sleep(delay)
+        attempt += 1
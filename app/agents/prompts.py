@@ -4,53 +4,25 @@ Agent Prompts - System prompts using LangChain message format
 Uses proper SystemMessage, HumanMessage, and ToolMessage usage.
 """
 
+import functools
+
 from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
 from typing import List, Dict, Any, Optional
 from app.agents.config import get_agent_config
 
 
-def build_system_prompt(agent_name: str, locale: Optional[str] = None, user_context: Optional[str] = None) -> SystemMessage:
-    """
-    Build system prompt for an agent.
-
-    Args:
-        agent_name: Name of the agent (personality, knowledge, support, custom, router)
-        locale: User locale (pt-BR, en, etc.)
-        user_context: Additional user context from memory
-
-    Returns:
-        SystemMessage with properly formatted system prompt
-    """
-    config = get_agent_config(agent_name)
-    if not config:
-        raise ValueError(f"Unknown agent: {agent_name}")
+_LANGUAGE_PT = "\n\nLANGUAGE: Respond in Brazilian Portuguese (pt-BR)"
+_LANGUAGE_EN = "\n\nLANGUAGE: Respond in English"
 
-    # Base system prompt
-    system_content = f"""You are {config.role}.
 
-GOAL: {config.goal}
+def is_portuguese(locale: Optional[str]) -> bool:
+    """True for pt, pt-BR, PT-br, ... in any case."""
+    return isinstance(locale, str) and locale[:2].lower() == "pt"
 
-BACKSTORY: {config.backstory}
 
-INSTRUCTIONS:
-- Follow InfinitePay policies: do not request or output secrets/PII
-- Avoid politics, violence, or hate speech
-- If insufficient context, say you don't know and suggest human support
-- Cite sources at the end as URLs under 'Sources:' when relevant
-- Communicate naturally in the user's language
-- Be helpful, professional, and concise
-
-AGENT CAPABILITIES:
-- Role: {config.role}
-- Goal: {config.goal}
-- Max Iterations: {config.max_iter}
-- Memory: {'Enabled' if config.memory else 'Disabled'}
-- Delegation: {'Allowed' if config.allow_delegation else 'Not Allowed'}
-"""
-
-    # Add agent-specific instructions
-    if agent_name == "personality":
-        system_content += """
+# Agent-specific instruction blocks appended to the shared system prompt
+_AGENT_BLOCKS = {
+    "personality": """
 PERSONALITY INSTRUCTIONS:
 - Focus on warm, welcoming interactions and natural conversation
 - Use user context to personalize responses (remember names, preferences, previous topics)
@@ -60,9 +32,8 @@ PERSONALITY INSTRUCTIONS:
 - Keep responses friendly, engaging, and conversational
 - Avoid repeating greetings if you've already greeted the user
 - Stay within InfinitePay topics; if the user asks about unrelated subjects, gently deflect and refocus on InfinitePay matters
-"""
-    elif agent_name == "knowledge":
-        system_content += """
+""",
+    "knowledge": """
 KNOWLEDGE INSTRUCTIONS:
 - Answer strictly about InfinitePay products (Maquininha, Tap to Pay, PDV, Pix, Conta, Boleto, Link, Empréstimo, Cartão)
 - Use provided context to give accurate information about products/pricing/features
@@ -71,9 +42,8 @@ KNOWLEDGE INSTRUCTIONS:
 - For fees questions, include 'annual fee (anuidade)', 'adhesion fee (taxa de adesão)', and 'service charges'
 - Output format: personalized greeting (if user known), short answer, details if needed, then 'Sources:'
 - Keep responses informative but conversational
-"""
-    elif agent_name == "support":
-        system_content += """
+""",
+    "support": """
 SUPPORT INSTRUCTIONS:
 - Help resolve technical issues and account problems with personalized assistance
 - Use user context to understand previous issues and provide continuity
@@ -82,9 +52,8 @@ SUPPORT INSTRUCTIONS:
 - Provide clear step-by-step instructions tailored to user's situation
 - Maintain user privacy and security in all communications
 - Escalate complex issues appropriately while keeping user informed
-"""
-    elif agent_name == "custom":
-        system_content += """
+""",
+    "custom": """
 CUSTOM INSTRUCTIONS:
 - Handle complex requests requiring human intervention with personalized service
 - Use user context to provide detailed information to human agents
@@ -93,9 +62,8 @@ CUSTOM INSTRUCTIONS:
 - Create appropriate escalation tickets with comprehensive user information
 - Provide clear information about escalation processes and expected timelines
 - Maintain professional communication while being empathetic to user needs
-"""
-    elif agent_name == "router":
-        system_content += """
+""",
+    "router": """
 ROUTER INSTRUCTIONS - INTELLIGENT ROUTING BASED ON CONTEXT:
 
 You are an intelligent routing agent that analyzes user messages and conversation context to determine the most appropriate agent to handle each request.
@@ -117,21 +85,87 @@ ROUTING GUIDELINES:
 Analyze the message and context naturally to make the best routing decision.
 
 RESPONSE FORMAT: Return ONLY the agent name (PersonalityAgent, KnowledgeAgent, CustomerSupportAgent, or CustomAgent)
+""",
+}
+
+
+@functools.lru_cache(maxsize=32)
+def _base_system_content(agent_name: str) -> str:
+    """Static part of an agent's system prompt (role, instructions, agent block); built once per agent."""
+    config = get_agent_config(agent_name)
+    if not config:
+        raise ValueError(f"Unknown agent: {agent_name}")
+
+    # Base system prompt
+    system_content = f"""You are {config.role}.
+
+GOAL: {config.goal}
+
+BACKSTORY: {config.backstory}
+
+INSTRUCTIONS:
+- Follow InfinitePay policies: do not request or output secrets/PII
+- Avoid politics, violence, or hate speech
+- If insufficient context, say you don't know and suggest human support
+- Cite sources at the end as URLs under 'Sources:' when relevant
+- Communicate naturally in the user's language
+- Be helpful, professional, and concise
+
+AGENT CAPABILITIES:
+- Role: {config.role}
+- Goal: {config.goal}
+- Max Iterations: {config.max_iter}
+- Memory: {'Enabled' if config.memory else 'Disabled'}
+- Delegation: {'Allowed' if config.allow_delegation else 'Not Allowed'}
 """
 
+    # Add agent-specific instructions
+    system_content += _AGENT_BLOCKS.get(agent_name, "")
+
+    return system_content
+
+
+def build_system_prompt(agent_name: str, locale: Optional[str] = None, user_context: Optional[str] = None) -> SystemMessage:
+    """
+    Build system prompt for an agent.
+
+    Args:
+        agent_name: Name of the agent (personality, knowledge, support, custom, router)
+        locale: User locale (pt-BR, en, etc.)
+        user_context: Additional user context from memory
+
+    Returns:
+        SystemMessage with properly formatted system prompt
+    """
+    return SystemMessage(content=system_prompt_text(agent_name, locale, user_context))
+
+
+def system_prompt_text(agent_name: str, locale: Optional[str] = None, user_context: Optional[str] = None) -> str:
+    """Plain-string system prompt, for callers that talk to the OpenAI API directly."""
+    system_content = _base_system_content(agent_name)
+
     # Add user context if available
     if user_context:
         system_content += f"\n\nUSER CONTEXT:\n{user_context}"
 
     # Add language preference
     if locale:
-        loc = str(locale).lower()
-        if loc.startswith("pt"):
-            system_content += "\n\nLANGUAGE: Respond in Brazilian Portuguese (pt-BR)"
-        else:
-            system_content += "\n\nLANGUAGE: Respond in English"
+        system_content += _LANGUAGE_PT if is_portuguese(locale) else _LANGUAGE_EN
+
+    return system_content
 
-    return SystemMessage(content=system_content)
+
+def _locale_bucket(locale: Optional[str]) -> str:
+    """Collapse a locale to the language line it selects: "pt", "en" or "" (none)."""
+    if not locale:
+        return ""
+    return "pt" if is_portuguese(locale) else "en"
+
+
+@functools.lru_cache(maxsize=16)
+def _cached_system_msg(agent_name: str, locale_bucket: str) -> SystemMessage:
+    """Shared context-free SystemMessage per agent/language; callers must not mutate it."""
+    return build_system_prompt(agent_name, locale_bucket or None, None)
 
 
 def create_agent_messages(
@@ -156,8 +190,11 @@ def create_agent_messages(
     """
     messages = []
 
-    # System message
-    system_msg = build_system_prompt(agent_name, locale, user_context)
+    # System message (context-free prompts are shared across calls)
+    if user_context:
+        system_msg = build_system_prompt(agent_name, locale, user_context)
+    else:
+        system_msg = _cached_system_msg(agent_name, _locale_bucket(locale))
     messages.append(system_msg)
 
     # User message
@@ -178,6 +215,7 @@ def create_agent_messages(
     return messages
 
 
+@functools.lru_cache(maxsize=32)
 def get_agent_prompt_template(agent_name: str) -> str:
     """
     Get prompt template for an agent.
@@ -219,7 +257,7 @@ def build_personality_prompt(user_message: str, locale: Optional[str] = None) ->
     config = get_agent_config("personality")
 
     language_instruction = ""
-    if locale and locale.lower().startswith("pt"):
+    if is_portuguese(locale):
         language_instruction = "Respond in Brazilian Portuguese naturally."
     else:
         language_instruction = "Respond in English naturally."
@@ -246,7 +284,7 @@ def build_knowledge_prompt(user_message: str, context: str = "", locale: Optiona
     config = get_agent_config("knowledge")
 
     language_instruction = ""
-    if locale and locale.lower().startswith("pt"):
+    if is_portuguese(locale):
         language_instruction = "Respond in Brazilian Portuguese."
     else:
         language_instruction = "Respond in English."
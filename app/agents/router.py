@@ -1,19 +1,54 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional
-import json
-from datetime import datetime
 
+import httpx
 from langsmith import traceable
-from langchain_core.tools import tool
-from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
 
 from app.graph.guardrails import enforce
-from app.graph.memory import get_user_context_prompt, update_user_context
+from app.graph.memory import get_user_context_prompt
+from app.agents import llm_pool
+from app.agents.prompts import system_prompt_text
+from app.agents.semantic_cache import embed_for_cache, get_router_cache
 from app.settings import settings
 from openai import OpenAI
 
+logger = logging.getLogger(__name__)
+
 
 # No hardcoded hints or keywords - let AI decide everything intelligently
 
+# Agent names accepted in the AI router's reply, checked in this order.
+# "customersupportagent" must resolve to support, so support precedes custom;
+# the "...agent" spellings contain these names and need no entries of their own.
+_AGENT_PRIORITY = ("personality", "knowledge", "support", "custom")
+
+# Pins routing calls to one OpenAI prompt-cache shard; bump when the router prompt changes
+_PROMPT_CACHE_KEY = "router-v1"
+
+# The router replies with a bare agent name ("CustomerSupportAgent" is ~4 tokens);
+# a tight cap bounds decode time if the model starts explaining itself
+_ROUTING_MAX_TOKENS = 16
+
+# Whole messages (lowercased, trailing punctuation stripped) whose route is not in
+# doubt: bare greetings and explicit asks for a human skip the routing LLM call
+_FAST_PATH_ROUTES = {
+    **dict.fromkeys(
+        ("oi", "olá", "ola", "bom dia", "boa tarde", "boa noite",
+         "hi", "hello", "hey", "good morning", "good afternoon", "good evening"),
+        "personality",
+    ),
+    **dict.fromkeys(("atendente", "humano", "human", "attendant"), "custom"),
+}
+
+# Routing history is checkpointed and returned as the route trace on every turn;
+# keep only the most recent decisions so long sessions don't grow it without bound
+_ROUTING_HISTORY_MAX = 32
+
+# Routing-cache embeddings run here so the sync node overlaps them with the user-context read
+_embed_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="RouterEmbed")
+
 
 def _detect_intent(message: str) -> str:
     """Simple fallback intent detection - AI should handle most decisions."""
@@ -24,10 +59,10 @@ def _detect_intent(message: str) -> str:
 
 @traceable(name="RouterAgent", metadata={"agent": "RouterAgent", "tags": ["agent", "router"]})
 def router_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    state = enforce(state)
-    message = (state.get("message") if isinstance(state, dict) else None) or ""
-    user_id = state.get("user_id") if isinstance(state, dict) else None
-    locale = state.get("locale") if isinstance(state, dict) else None
+    state = enforce(state)  # always a dict
+    message = state.get("message") or ""
+    user_id = state.get("user_id")
+    locale = state.get("locale")
 
     # Let the AI detect language naturally from context
     # No hardcoded language detection
@@ -35,7 +70,7 @@ def router_node(state: Dict[str, Any]) -> Dict[str, Any]:
     intent = _detect_intent(message)
 
     # Log routing decision for debugging
-    print(f"🎯 Router: User {user_id} -> {intent.upper()} (message: '{message[:50]}...')")
+    logger.debug("Router: user %s -> %s (message: %r)", user_id, intent.upper(), message[:50])
 
     # Preserve original state fields and add routing results
     result = {
@@ -54,132 +89,175 @@ def router_node(state: Dict[str, Any]) -> Dict[str, Any]:
 # Completely free AI routing - no hardcoded tools or agents
 # AI decides everything autonomously based on context and message content
 
+# Shared routing client, built on first use so its connection pool is reused across turns
+_routing_client: Optional[OpenAI] = None
+
+# Every turn makes a routing call, so keep warm sockets around; a short connect
+# timeout fails fast to the fallback route instead of stalling the turn
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60.0)
+_HTTP_TIMEOUT = httpx.Timeout(30.0, connect=3.0)
+
+
 def _get_routing_llm_client() -> Optional[OpenAI]:
     """Get LLM client for intelligent routing."""
-    if not settings.openai_api_key:
+    global _routing_client
+    if _routing_client is None and settings.openai_api_key:
+        _routing_client = OpenAI(
+            api_key=settings.openai_api_key,
+            max_retries=2,
+            http_client=httpx.Client(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT),
+        )
+    return _routing_client
+
+
+def _fallback_decision(reason: str) -> Dict[str, Any]:
+    return {
+        "intent": "knowledge",
+        "target_agent": "knowledge",
+        "routing_confidence": 0.5,
+        "routing_reason": reason,
+        "fallback": True
+    }
+
+
+def _agent_decision(target_agent: str, reason: str) -> Dict[str, Any]:
+    return {
+        "intent": target_agent,
+        "target_agent": target_agent,
+        "routing_confidence": 0.9,
+        "routing_reason": reason,
+        "fallback": False
+    }
+
+
+def _routing_cache_bucket(context_prompt: str) -> str:
+    # Paraphrases of a recently routed message reuse its decision; the bucket only
+    # separates first-contact users from returning ones so hits stay frequent
+    return "router:ctx" if context_prompt else "router"
+
+
+def _routing_request(message: str, context_prompt: str) -> Dict[str, Any]:
+    """Chat completion kwargs for one routing decision."""
+    # Add a minimal, non-semantic jitter to avoid upstream caching of identical prompts
+    routing_time = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    # Static router prompt first so OpenAI's prefix cache can reuse it across requests;
+    # everything that varies per turn (context, jitter, message) goes in the user turn
+    return {
+        "model": settings.openai_model or "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": system_prompt_text("router")},
+            {
+                "role": "user",
+                "content": f"USER CONTEXT:\n{context_prompt}\n[routing_time: {routing_time}]\n\nUSER MESSAGE: {message}",
+            },
+        ],
+        "temperature": 0.3,  # Slight creativity for better decisions
+        "max_tokens": _ROUTING_MAX_TOKENS,
+        "extra_body": {"prompt_cache_key": _PROMPT_CACHE_KEY},
+    }
+
+
+def _decision_from_reply(ai_decision: str) -> Dict[str, Any]:
+    # Extract agent from AI response (first name in priority order wins)
+    ai_lower = ai_decision.lower()
+    target_agent = next((agent for agent in _AGENT_PRIORITY if agent in ai_lower), "knowledge")
+    return _agent_decision(target_agent, f"AI decided: {ai_decision}")
+
+
+def _fast_path_decision(message: str) -> Optional[Dict[str, Any]]:
+    target_agent = _FAST_PATH_ROUTES.get(message.strip().lower().rstrip("!.?"))
+    if target_agent is None:
         return None
-    return OpenAI(api_key=settings.openai_api_key)
+    decision = _agent_decision(target_agent, "keyword fast path")
+    decision["routing_confidence"] = 0.95
+    return decision
 
-def _intelligent_routing(message: str, user_id: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+
+def _cached_decision(bucket: str, vector: list) -> Optional[Dict[str, Any]]:
+    cached_agent = get_router_cache().lookup(bucket, vector) if vector else None
+    if cached_agent:
+        return _agent_decision(cached_agent, "AI decision (semantic cache hit)")
+    return None
+
+
+def _intelligent_routing(
+    message: str,
+    user_id: str,
+    context: Optional[Dict[str, Any]] = None,
+    context_prompt: Optional[str] = None,
+    vector: Optional[list] = None,
+) -> Dict[str, Any]:
     """Completely free AI routing - no hardcoded tools or constraints."""
+    fast = _fast_path_decision(message)
+    if fast:
+        return fast
+
     client = _get_routing_llm_client()
     if not client:
         # Simple fallback when AI is unavailable
-        return {
-            "intent": "knowledge",
-            "target_agent": "knowledge",
-            "routing_confidence": 0.5,
-            "routing_reason": "AI unavailable - using default routing",
-            "fallback": True
-        }
+        return _fallback_decision("AI unavailable - using default routing")
 
-    # Get user context for better routing decisions
-    context_prompt = get_user_context_prompt(user_id) if user_id else ""
+    # Get user context for better routing decisions (callers that already read it pass it in)
+    if context_prompt is None:
+        context_prompt = get_user_context_prompt(user_id) if user_id else ""
 
-    # Use structured routing prompt
-    from app.agents.prompts import build_system_prompt, create_agent_messages
-
-    # Create structured messages
-    # Add a minimal, non-semantic jitter to avoid upstream caching of identical prompts
-    routing_time = datetime.now().isoformat(timespec="seconds")
-    messages = create_agent_messages(
-        agent_name="router",
-        user_message=f"{message}",
-        user_context=f"{context_prompt}\n[routing_time: {routing_time}]"
-    )
+    cache_bucket = _routing_cache_bucket(context_prompt)
+    if vector is None:
+        vector = embed_for_cache(message) if settings.router_cache_enabled else []
+    cached = _cached_decision(cache_bucket, vector)
+    if cached:
+        return cached
 
     try:
-        # Convert to OpenAI format for API call
-        openai_messages = []
-        for msg in messages:
-            if hasattr(msg, 'type'):
-                if msg.type == 'system':
-                    openai_messages.append({"role": "system", "content": msg.content})
-                elif msg.type == 'human':
-                    openai_messages.append({"role": "user", "content": msg.content})
-
-        response = client.chat.completions.create(
-            model=settings.openai_model or "gpt-4o-mini",
-            messages=openai_messages,
-            temperature=0.3,  # Slight creativity for better decisions
-            max_tokens=100
-        )
-
-        ai_decision = response.choices[0].message.content.strip()
-
-        # Parse AI decision
-        agent_mapping = {
-            "personality": "personality",
-            "personalityagent": "personality",
-            "knowledge": "knowledge",
-            "knowledgeagent": "knowledge",
-            "support": "support",
-            "customersupportagent": "support",
-            "custom": "custom",
-            "customagent": "custom"
-        }
-
-        # Extract agent from AI response
-        ai_lower = ai_decision.lower()
-        target_agent = "knowledge"  # Default
-
-        for key, agent in agent_mapping.items():
-            if key in ai_lower:
-                target_agent = agent
-                break
-
-        return {
-            "intent": target_agent,
-            "target_agent": target_agent,
-            "routing_confidence": 0.9,
-            "routing_reason": f"AI decided: {ai_decision}",
-            "fallback": False
-        }
-
+        response = llm_pool.chat(client, **_routing_request(message, context_prompt))
+        decision = _decision_from_reply(response.choices[0].message.content.strip())
     except Exception as e:
-        print(f"⚠️ AI routing failed: {e}, using fallback")
-        return {
-            "intent": "knowledge",
-            "target_agent": "knowledge",
-            "routing_confidence": 0.5,
-            "routing_reason": "AI routing failed - using fallback",
-            "fallback": True
-        }
+        logger.warning("AI routing failed: %s, using fallback", e)
+        return _fallback_decision("AI routing failed - using fallback")
 
-@traceable(name="IntelligentRouter", metadata={"agent": "RouterAgent", "tags": ["router", "ai-routing"]})
-def intelligent_router_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Intelligent router that uses AI to make routing decisions."""
-    state = enforce(state)
-    message = state.get("message", "")
-    user_id = state.get("user_id", "unknown")
+    if vector:
+        get_router_cache().store(cache_bucket, message, vector, decision["target_agent"])
+    return decision
 
-    # Get user context for intelligent routing
+
+def _safe_user_context_prompt(user_id: str) -> str:
     try:
-        user_context = get_user_context_prompt(user_id)
+        return get_user_context_prompt(user_id)
     except Exception:
-        user_context = ""
+        return ""
 
-    # Use AI-powered routing
-    routing_decision = _intelligent_routing(message, user_id, state)
 
+def _router_update(
+    state: Dict[str, Any],
+    message: str,
+    user_id: str,
+    routing_decision: Dict[str, Any],
+    user_context: str,
+) -> Dict[str, Any]:
+    """State update shared by the sync and async router nodes."""
     # Update routing history
-    routing_history = state.get("routing_history", [])
     routing_event = {
-        "timestamp": datetime.now().isoformat(),
+        # Epoch milliseconds, like message timestamps in the API; formatted only for display
+        "timestamp": int(time.time() * 1000),
         "message": message,
         "decision": routing_decision["target_agent"],
         "confidence": routing_decision["routing_confidence"],
         "reason": routing_decision["routing_reason"],
         "fallback": routing_decision["fallback"]
     }
+    routing_history = (state.get("routing_history") or [])[-(_ROUTING_HISTORY_MAX - 1):]
     routing_history.append(routing_event)
 
     # Log routing decision
-    print(f"🎯 AI Router: {user_id} -> {routing_decision['target_agent'].upper()}")
-    print(f"   Confidence: {routing_decision['routing_confidence']}")
-    print(f"   Reason: {routing_decision['routing_reason']}")
-    if routing_decision["fallback"]:
-        print("   📝 Using keyword fallback")
+    logger.debug(
+        "AI Router: %s -> %s (confidence %s, reason: %s, fallback: %s)",
+        user_id,
+        routing_decision["target_agent"].upper(),
+        routing_decision["routing_confidence"],
+        routing_decision["routing_reason"],
+        routing_decision["fallback"],
+    )
 
     # Return enhanced state
     return {
@@ -190,16 +268,38 @@ def intelligent_router_node(state: Dict[str, Any]) -> Dict[str, Any]:
         "routing_reason": routing_decision["routing_reason"],
         "user_context": user_context,
         "message": message,
-    "user_id": user_id,
-    # Reset ephemeral fields to avoid leaking previous answers/grounding
-    "answer": None,
-    "agent": None,
-    "grounding": None,
-    "meta": {"steps": [
-        f"Router analyzed message and chose {routing_decision['target_agent']} (confidence {routing_decision['routing_confidence']:.2f})",
-    ]},
+        "user_id": user_id,
+        # Reset ephemeral fields to avoid leaking previous answers/grounding
+        "answer": None,
+        "agent": None,
+        "grounding": None,
+        "meta": {"steps": [
+            f"Router analyzed message and chose {routing_decision['target_agent']} (confidence {routing_decision['routing_confidence']:.2f})",
+        ]},
     }
 
+
+@traceable(name="IntelligentRouter", metadata={"agent": "RouterAgent", "tags": ["router", "ai-routing"]})
+def intelligent_router_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Intelligent router that uses AI to make routing decisions."""
+    state = enforce(state)
+    message = state.get("message", "")
+    user_id = state.get("user_id", "unknown")
+
+    # Embed for the routing cache while the user context is read (not needed on the fast path)
+    vector_future = None
+    if settings.router_cache_enabled and _fast_path_decision(message) is None:
+        vector_future = _embed_pool.submit(embed_for_cache, message)
+
+    # Get user context for intelligent routing
+    user_context = _safe_user_context_prompt(user_id)
+    vector = vector_future.result() if vector_future is not None else []
+
+    # Use AI-powered routing (reuse the context read above instead of fetching it again)
+    routing_decision = _intelligent_routing(message, user_id, state, context_prompt=user_context, vector=vector)
+    return _router_update(state, message, user_id, routing_decision, user_context)
+
+
 @traceable(name="RouterDecision", metadata={"agent": "RouterAgent", "tags": ["router", "decision"]})
 def route_decision(state: Dict[str, Any]) -> str:
     """Routing decision uses the latest AI intent for each message.
@@ -215,7 +315,7 @@ def route_decision(state: Dict[str, Any]) -> str:
 
     # Log a concise routing trace
     if intent:
-        print(f"🧭 Route decision (latest intent): {intent}")
+        logger.debug("Route decision (latest intent): %s", intent)
 
     # Support all known agents explicitly
     if intent in {"custom", "support", "knowledge", "personality"}:
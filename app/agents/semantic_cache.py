@@ -0,0 +1,226 @@
+"""
+Semantic response cache.
+
+Stores (message embedding -> answer) pairs and serves an answer when a new
+message embeds close enough (cosine similarity) to a cached one. Used by the
+personality agent so near-identical greetings skip the completion call, and
+by the AI router so paraphrased questions reuse a recent routing decision.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+import math
+import threading
+import time
+
+try:  # numpy is optional; pure-Python dot products are used without it
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the deployment
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vector: List[float]) -> Optional[List[float]]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    if not norm:
+        return None
+    return [x / norm for x in vector]
+
+
+def _dot(row: List[float], query: List[float]) -> float:
+    return sum(a * b for a, b in zip(row, query))
+
+
+class _Bucket:
+    """
+    Rows of one cache bucket, guarded by the bucket's own lock.
+
+    Vectors live in a preallocated matrix (grown geometrically up to the cache
+    capacity) and are written in place; freed rows are zeroed and reused.
+    """
+
+    __slots__ = ("lock", "order", "texts", "answers", "stamps", "matrix", "rows", "free")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.order: "OrderedDict[str, int]" = OrderedDict()  # text -> row, least recently used first
+        self.texts: List[Optional[str]] = []
+        self.answers: List[Optional[str]] = []
+        self.stamps: List[float] = []
+        self.matrix = None  # ndarray (allocated rows x dim), or a list of rows without numpy
+        self.rows = 0  # rows handed out so far (high-water mark)
+        self.free: List[int] = []
+
+    def dim(self) -> int:
+        if self.matrix is None:
+            return 0
+        return self.matrix.shape[1] if np is not None else len(self.matrix[0])
+
+    def allocate(self, capacity: int, dim: int) -> Optional[int]:
+        """Row for a new entry: a freed row, a fresh one, or None when the bucket is full."""
+        if self.free:
+            return self.free.pop()
+        if self.rows >= capacity:
+            return None
+        row = self.rows
+        self.rows += 1
+        if np is not None:
+            allocated = 0 if self.matrix is None else self.matrix.shape[0]
+            if row >= allocated:
+                grown = np.zeros((min(capacity, max(16, allocated * 2)), dim), dtype=np.float32)
+                if self.matrix is not None:
+                    grown[:allocated] = self.matrix
+                self.matrix = grown
+        else:
+            if self.matrix is None:
+                self.matrix = []
+            self.matrix.append([0.0] * dim)
+        self.texts.append(None)
+        self.answers.append(None)
+        self.stamps.append(0.0)
+        return row
+
+    def write(self, row: int, text: Optional[str], vector: Optional[List[float]], answer: Optional[str], stamp: float):
+        if np is not None:
+            self.matrix[row] = vector if vector is not None else 0.0
+        else:
+            self.matrix[row] = vector if vector is not None else [0.0] * len(self.matrix[row])
+        self.texts[row] = text
+        self.answers[row] = answer
+        self.stamps[row] = stamp
+
+    def release(self, row: int):
+        del self.order[self.texts[row]]
+        self.write(row, None, None, None, 0.0)
+        self.free.append(row)
+
+
+class SemanticCache:
+    """
+    LRU cache of answers keyed by message embeddings, partitioned by bucket.
+
+    A bucket separates answers that must never be mixed (e.g. agent + locale)
+    and has its own lock, so traffic on one bucket never waits on another.
+    Vectors are normalised on insert so a lookup is a single matrix-vector product,
+    computed outside the lock. With `ttl` set, an expired entry is dropped when it
+    is the best match instead of being served.
+    """
+
+    def __init__(self, capacity: int = 512, threshold: float = 0.95, ttl: Optional[float] = None):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()  # guards the bucket map only
+
+    def _best_row(self, matrix, rows: int, query: List[float]) -> int:
+        if np is not None:
+            return int((matrix[:rows] @ np.asarray(query, dtype=np.float32)).argmax())
+        scores = [_dot(row, query) for row in matrix[:rows]]
+        return max(range(len(scores)), key=scores.__getitem__)
+
+    def lookup(self, bucket: str, vector: List[float]) -> Optional[str]:
+        """Return the cached answer most similar to `vector`, if above the threshold."""
+        query = _normalize(vector) if vector else None
+        entries = self._buckets.get(bucket)
+        if query is None or entries is None:
+            return None
+
+        with entries.lock:
+            matrix, rows = entries.matrix, entries.rows
+            if not entries.order or len(query) != entries.dim():
+                return None
+            if np is None:
+                matrix = list(matrix[:rows])
+
+        # Scoring reads a snapshot reference; the winning row is re-checked under the lock
+        best = self._best_row(matrix, rows, query)
+
+        with entries.lock:
+            text = entries.texts[best]
+            if text is None:
+                return None
+            row = entries.matrix[best]
+            score = float(row @ np.asarray(query, dtype=np.float32)) if np is not None else _dot(row, query)
+            if score < self.threshold:
+                return None
+            if self.ttl is not None and time.monotonic() - entries.stamps[best] > self.ttl:
+                entries.release(best)
+                return None
+            entries.order.move_to_end(text)
+            return entries.answers[best]
+
+    def store(self, bucket: str, text: str, vector: List[float], answer: str):
+        """Cache `answer` for `text`, reusing the least recently used row when full."""
+        normalized = _normalize(vector) if vector else None
+        if normalized is None or not answer:
+            return
+
+        entries = self._buckets.get(bucket)
+        if entries is None:
+            with self._lock:
+                entries = self._buckets.setdefault(bucket, _Bucket())
+
+        with entries.lock:
+            if entries.matrix is not None and len(normalized) != entries.dim():
+                return
+
+            row = entries.order.get(text)
+            if row is None:
+                row = entries.allocate(self.capacity, len(normalized))
+                if row is None:
+                    _, row = entries.order.popitem(last=False)
+                entries.order[text] = row
+            else:
+                entries.order.move_to_end(text)
+            entries.write(row, text, normalized, answer, time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            buckets = list(self._buckets.values())
+        return sum(len(entries.order) for entries in buckets)
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_router_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Get the process-wide semantic cache, sized from settings."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        from app.settings import settings
+        _semantic_cache = SemanticCache(
+            capacity=settings.semantic_cache_size,
+            threshold=settings.semantic_cache_threshold,
+        )
+    return _semantic_cache
+
+
+def get_router_cache() -> SemanticCache:
+    """Get the process-wide routing-decision cache, sized from settings."""
+    global _router_cache
+    if _router_cache is None:
+        from app.settings import settings
+        _router_cache = SemanticCache(
+            capacity=settings.router_cache_size,
+            threshold=settings.router_cache_threshold,
+            ttl=settings.router_cache_ttl,
+        )
+    return _router_cache
+
+
+def embed_for_cache(text: str) -> List[float]:
+    """Embed text for a semantic cache lookup; [] when embeddings are unavailable."""
+    try:
+        from app.rag.embeddings import embed_query
+        return embed_query(text.strip().lower()) or []
+    except Exception as e:
+        logger.debug("semantic cache embedding failed: %s", e)
+        return []
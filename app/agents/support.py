@@ -1,86 +1,96 @@
+import logging
 from typing import Dict, Any
-from app.tools.user_profile import get_user_info
-from app.tools.ticketing import open_ticket
-from app.graph.memory import get_user_context_prompt, update_user_context
+from app.tools.user_profile import ProfileUnavailable, get_user_info
+from app.tools.ticketing import TicketBackendError, open_ticket
+from app.graph.memory import get_user_context_prompt
+from app.graph.prefetch import schedule_user_context_update
 
 from langsmith import traceable
 
+logger = logging.getLogger(__name__)
+
+# Ticket confirmation per (Portuguese locale?, returning user?)
+_ANSWERS = {
+    (True, True): ("Bem-vindo de volta! Já abri um chamado (#{ticket_id}). "
+                   "Vamos considerar seus atendimentos anteriores e retornamos em seguida."),
+    (False, True): ("Welcome back! I've opened a Support Ticket (#{ticket_id}). "
+                    "We'll review your previous interactions and get back to you shortly."),
+    (True, False): ("Abri um chamado (#{ticket_id}). "
+                    "Nossa equipe entrará em contato em breve para ajudar."),
+    (False, False): ("I've opened a Support Ticket (#{ticket_id}). "
+                     "Our team will contact you shortly to help resolve it."),
+}
+
+# Reply when no ticket could be opened, per Portuguese locale?
+_TICKET_FAILED = {
+    True: "Não consegui abrir um chamado agora. Por favor, tente novamente em alguns minutos.",
+    False: "I couldn't open a Support Ticket right now. Please try again in a few minutes.",
+}
+
 
 @traceable(
     name="CustomerSupportAgent",
     metadata={"agent": "CustomerSupportAgent", "tags": ["agent", "support"]},
 )
 def support_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    user_id = (state.get("user_id") if isinstance(state, dict) else None) or "unknown"
-    message = (state.get("message") if isinstance(state, dict) else None) or ""
-    locale = (state.get("locale") if isinstance(state, dict) else None) or ""
+    if not isinstance(state, dict):
+        state = {}
+    user_id = state.get("user_id") or "unknown"
+    message = state.get("message") or ""
+    locale = state.get("locale") or ""
 
-    # Get user context for personalized support
+    # Get user context for personalized support; the AI router already read it into
+    # state["user_context"] this turn, so only hit the memory store when it did not run
+    context_prompt = state.get("user_context")
+    if not isinstance(context_prompt, str):
+        try:
+            context_prompt = get_user_context_prompt(user_id)
+        except Exception as e:
+            logger.warning("Support: failed to get user context: %s", e)
+            context_prompt = ""
+    if context_prompt:
+        logger.debug("Support: using user context for %s", user_id)
+
+    # Get user profile information; a ticket is still worth opening without it
     try:
-        context_prompt = get_user_context_prompt(user_id)
-        if context_prompt:
-            print(f"📋 Support: Using user context for {user_id}")
-    except Exception as e:
-        print(f"⚠️ Support: Failed to get user context: {e}")
-        context_prompt = ""
-
-    # Get recent conversation context (short-term memory)
-    conversation_context = ""
-    if state.get("messages"):
-        messages = state["messages"]
-        # Get recent conversation history (last 5 exchanges)
-        recent_messages = messages[-6:-1] if len(messages) > 6 else messages[:-1] if messages else []
-        if recent_messages:
-            context_parts = []
-            for msg in recent_messages:
-                if hasattr(msg, 'type'):
-                    if msg.type == 'human':
-                        context_parts.append(f"User: {msg.content}")
-                    elif msg.type == 'ai':
-                        context_parts.append(f"Assistant: {msg.content}")
-            if context_parts:
-                conversation_context = "\n".join(context_parts)
-                print(f"📋 Support: Using recent conversation context ({len(context_parts)} messages)")
-
-    # Get user profile information
-    profile = get_user_info(user_id)
+        profile = get_user_info(user_id)
+    except ProfileUnavailable as e:
+        logger.warning("Support: user profile unavailable for %s: %s", user_id, e)
+        profile = {}
 
     # Do not hardcode categories via keywords; let downstream workflows classify if needed
     category = "general"
 
-    # Create support ticket
-    ticket = open_ticket(user_id, category, summary=message)
-
     # Localized, natural response (no rigid prefixes)
     is_pt = str(locale).lower().startswith("pt")
-    if context_prompt and "returning user" in context_prompt:
-        answer = (
-            (f"Bem-vindo de volta! Já abri um chamado (#{ticket['id']}). "
-             "Vamos considerar seus atendimentos anteriores e retornamos em seguida.")
-            if is_pt
-            else (f"Welcome back! I've opened a Support Ticket (#{ticket['id']}). "
-                  "We'll review your previous interactions and get back to you shortly.")
-        )
-    else:
-        answer = (
-            (f"Abri um chamado (#{ticket['id']}). "
-             "Nossa equipe entrará em contato em breve para ajudar.")
-            if is_pt
-            else (f"I've opened a Support Ticket (#{ticket['id']}). "
-                  "Our team will contact you shortly to help resolve it.")
-        )
+
+    # Create support ticket; without one there is nothing to confirm, so reply right away
+    try:
+        ticket = open_ticket(user_id, category, summary=message)
+    except TicketBackendError as e:
+        logger.warning("Support: failed to open ticket for %s: %s", user_id, e)
+        return {
+            "answer": _TICKET_FAILED[is_pt],
+            "agent": "CustomerSupportAgent",
+            "grounding": {"mode": "tools", "artifacts": [{"type": "user_profile", "data": profile}] if profile else []},
+            "meta": {"agent": "CustomerSupportAgent", "category": category, "error": "ticket_backend"},
+        }
+
+    returning = bool(context_prompt) and "returning user" in context_prompt
+    answer = _ANSWERS[is_pt, returning].format(ticket_id=ticket["id"])
 
     # Update user context with support interaction
+    # (background writer, so the reply is not held up by the memory-store write)
     try:
-        update_user_context(user_id, message, "CustomerSupportAgent", answer)
+        schedule_user_context_update(user_id, message, "CustomerSupportAgent", answer)
     except Exception as e:
-        print(f"⚠️ Support: Failed to update user context: {e}")
+        logger.warning("Support: failed to update user context: %s", e)
 
     # Do not use 'sources' here to avoid frontend rendering as web sources
     grounding = {
         "mode": "tools",
         "artifacts": [
-            {"type": "user_profile", "data": profile},
+            *([{"type": "user_profile", "data": profile}] if profile else []),
             {"type": "ticket", "data": ticket},
         ],
     }
@@ -94,7 +104,7 @@ def support_node(state: Dict[str, Any]) -> Dict[str, Any]:
 
     return {
         "answer": answer,
-    "agent": "CustomerSupportAgent",
+        "agent": "CustomerSupportAgent",
         "grounding": grounding,
         "meta": meta,
     }
@@ -1,20 +1,27 @@
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from app.graph.builder import build_graph
 from app.graph.memory import (
     get_langgraph_checkpointer,
-    update_user_context,
     get_user_context_prompt
 )
+from app.graph.prefetch import schedule_user_context_update
 from app.settings import settings
 import time
 import json
 import asyncio
+import logging
+from collections import deque
 from typing import Any, Dict, List
 from fastapi.middleware.cors import CORSMiddleware
 from app import db as dbmod
 
+try:  # redis is optional; without it (or REDIS_URL) rate limits are per process
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - depends on the deployment
+    aioredis = None
+
 
 class MessagePayload(BaseModel):
     message: str
@@ -22,7 +29,21 @@ class MessagePayload(BaseModel):
     locale: str | None = None
 
 
-app = FastAPI()
+# Route module loggers through LOG_LEVEL; per-request debug diagnostics are dropped at INFO and above
+logging.basicConfig(
+    level=getattr(logging, str(settings.log_level).upper(), logging.INFO),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+# orjson (a C extension) encodes responses several times faster than the stdlib encoder
+try:
+    import orjson  # noqa: F401
+    _JSONResponse = ORJSONResponse
+except ImportError:  # pragma: no cover - depends on the deployment
+    _JSONResponse = JSONResponse
+
+app = FastAPI(default_response_class=_JSONResponse)
 # CORS (useful for local dev: CRA on :3000 calling API on :8000)
 app.add_middleware(
     CORSMiddleware,
@@ -44,8 +65,14 @@ async def initialize_checkpointer():
     # Initialize warm-up system (includes embeddings pre-loading)
     print("[WARMUP] Initializing Knowledge Agent warm-up system...")
     try:
-        from app.agents.knowledge.warmup import initialize_warmup_system
-        initialize_warmup_system()
+        from app.agents.knowledge.warmup import get_warmup_instance, initialize_warmup_system
+        if not settings.knowledge_warmup_enabled:
+            print("[WARMUP] Knowledge warm-up disabled (KNOWLEDGE_WARMUP_ENABLED=false)")
+        elif settings.knowledge_warmup_async:
+            # Warm up in the background so startup doesn't block the event loop
+            get_warmup_instance().warmup_async()
+        else:
+            initialize_warmup_system()
     except Exception as e:
         print(f"[WARNING] Failed to initialize warm-up system: {e}")
         # Fallback to basic embeddings pre-loading
@@ -94,33 +121,121 @@ async def initialize_checkpointer():
     print("[READY] FastAPI Startup Complete - Knowledge Agent Ready!")
 
 
-_rate_limiter_store: dict[str, list[float]] = {}
+@app.on_event("shutdown")
+async def shutdown_warmup():
+    from app.agents.knowledge.warmup import get_warmup_instance
+    await get_warmup_instance().shutdown()
+
+
+# Sliding-window rate limiter: per-user times (monotonic clock) of the last `limit` requests, oldest first
+_RATE_LIMIT_WINDOW = 30.0
+_rate_limiter_store: dict[str, deque] = {}
+_rate_limiter_last_sweep = 0.0
+_redis = None
+
+# Redis limiter: short socket timeouts, and after a failure Redis is skipped for a cooldown
+_REDIS_TIMEOUT = 0.25
+_REDIS_RETRY_AFTER = 30.0
+_redis_outage = False
+_redis_retry_at = 0.0
 
 # Simple in-memory conversation store (dev fallback).
 # For production, persist via Supabase/Postgres.
 _conversations: Dict[str, List[Dict[str, Any]]] = {}
 
+# In-flight /message requests keyed by (user_id, message, locale); a client retry joins the running one
+_inflight_messages: Dict[tuple, asyncio.Future] = {}
+
 
 # Database initialization is now handled by the checkpointer setup
 
 
-def _allow_request(user_id: str) -> bool:
-    window = 30.0
-    limit = max(1, int((settings.rate_limit_per_minute or 60) / 2))
-    now = time.time()
-    arr = _rate_limiter_store.setdefault(user_id, [])
-    # prune
-    while arr and now - arr[0] > window:
-        arr.pop(0)
-    if len(arr) >= limit:
+def _sweep_rate_limiter(now: float) -> None:
+    """Forget users whose newest request has left the window, at most once per window."""
+    global _rate_limiter_last_sweep
+    if now - _rate_limiter_last_sweep < _RATE_LIMIT_WINDOW:
+        return
+    _rate_limiter_last_sweep = now
+    for user_id in [u for u, arr in _rate_limiter_store.items() if not arr or now - arr[-1] > _RATE_LIMIT_WINDOW]:
+        del _rate_limiter_store[user_id]
+
+
+def _rate_limit() -> int:
+    return max(1, int((settings.rate_limit_per_minute or 60) / 2))
+
+
+def _allow_request_local(user_id: str) -> bool:
+    limit = _rate_limit()
+    now = time.monotonic()
+    _sweep_rate_limiter(now)
+    arr = _rate_limiter_store.get(user_id)
+    if arr is None:
+        arr = _rate_limiter_store[user_id] = deque(maxlen=limit)
+    # Only the last `limit` requests are kept; the user is over the limit iff the oldest is still in the window
+    if len(arr) == arr.maxlen and now - arr[0] <= _RATE_LIMIT_WINDOW:
         return False
     arr.append(now)
     return True
 
 
+def _get_redis():
+    """Shared Redis client for rate limiting, or None when REDIS_URL/redis is unavailable."""
+    global _redis
+    if _redis is None and settings.redis_url and aioredis is not None:
+        _redis = aioredis.from_url(
+            settings.redis_url,
+            socket_connect_timeout=_REDIS_TIMEOUT,
+            socket_timeout=_REDIS_TIMEOUT,
+        )
+    return _redis
+
+
+async def _allow_request(user_id: str) -> bool:
+    """
+    Rate-limit a user across all workers when Redis is configured.
+
+    Uses a fixed window counter (INCR + EXPIRE in one round-trip); falls back
+    to the in-process sliding window when Redis is not configured or fails.
+    A failure switches to the local limiter for _REDIS_RETRY_AFTER seconds and
+    is logged once per outage.
+    """
+    global _redis_outage, _redis_retry_at
+    redis_client = _get_redis()
+    if redis_client is not None and time.monotonic() >= _redis_retry_at:
+        key = f"rl:{user_id}:{int(time.time() // _RATE_LIMIT_WINDOW)}"
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.incr(key)
+                pipe.expire(key, int(_RATE_LIMIT_WINDOW) * 2)
+                count, _ = await pipe.execute()
+        except Exception as e:
+            if not _redis_outage:
+                logger.warning("Redis rate limiter unavailable (%s), using the local limiter", e)
+            _redis_outage = True
+            _redis_retry_at = time.monotonic() + _REDIS_RETRY_AFTER
+        else:
+            if _redis_outage:
+                logger.info("Redis rate limiter recovered")
+                _redis_outage = False
+            return count <= _rate_limit()
+    return _allow_request_local(user_id)
+
+
+# Probe endpoints serve pre-encoded bodies with an ETag; a matching If-None-Match gets a 304
+_APP_VERSION = "0.1.0"
+_HEALTH_BODY, _HEALTH_ETAG = b'{"status":"ok"}', '"ok"'
+_VERSION_BODY, _VERSION_ETAG = json.dumps({"version": _APP_VERSION}).encode(), f'"{_APP_VERSION}"'
+
+
+def _static_json(request: Request, body: bytes, etag: str) -> Response:
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
 @app.get("/health")
-async def health():
-    return {"status": "ok"}
+async def health(request: Request):
+    return _static_json(request, _HEALTH_BODY, _HEALTH_ETAG)
 
 @app.get("/api/v1/warmup/status")
 async def warmup_status():
@@ -144,8 +259,20 @@ async def warmup_status():
 
 
 @app.get("/version")
-async def version():
-    return {"version": "0.1.0"}
+async def version(request: Request):
+    return _static_json(request, _VERSION_BODY, _VERSION_ETAG)
+
+
+def _result_to_dict(result: Any) -> Dict[str, Any]:
+    """Normalize a graph result to a dict; graph.invoke already returns one."""
+    if isinstance(result, dict):
+        return result
+    if hasattr(result, "model_dump"):
+        return result.model_dump()
+    try:  # best-effort
+        return dict(result)
+    except Exception:
+        return {"answer": str(result)}
 
 
 @app.middleware("http")
@@ -153,25 +280,40 @@ async def add_process_time_header(request: Request, call_next):
     try:
         response = await call_next(request)
     except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=500)
+        return _JSONResponse({"error": str(e)}, status_code=500)
     return response
 
 
+def _forget_inflight(key: tuple, fut: asyncio.Future) -> None:
+    if _inflight_messages.get(key) is fut:
+        del _inflight_messages[key]
+
+
 @app.post("/api/v1/message")
 async def message_endpoint(payload: MessagePayload, request: Request):
-    global graph, checkpointer
-
     # Ensure graph is initialized
     if graph is None:
         raise HTTPException(status_code=503, detail="Service initializing, please try again")
 
-    try:
-        # basic per-user rate limiting
-        client_host = request.client.host if request.client is not None else "anonymous"
-        user_key = payload.user_id or client_host
-        if not _allow_request(user_key):
-            raise HTTPException(status_code=429, detail="Rate limit exceeded")
+    # basic per-user rate limiting; every caller counts, including ones joining a run below
+    client_host = request.client.host if request.client is not None else "anonymous"
+    if not await _allow_request(payload.user_id or client_host):
+        raise HTTPException(status_code=429, detail="Rate limit exceeded")
+
+    # Coalesce concurrent identical requests so a retry can't open a second ticket
+    key = (payload.user_id, payload.message, payload.locale)
+    pending = _inflight_messages.get(key)
+    if pending is None or pending.done():
+        pending = asyncio.ensure_future(_process_message(payload, request))
+        _inflight_messages[key] = pending
+        pending.add_done_callback(lambda fut: _forget_inflight(key, fut))
+    # Shielded so a disconnecting caller doesn't cancel the run others are waiting on
+    return await asyncio.shield(pending)
 
+
+async def _process_message(payload: MessagePayload, request: Request):
+    client_host = request.client.host if request.client is not None else "anonymous"
+    try:
         # Persist user message first (best-effort)
         try:
             user_msg = {
@@ -194,24 +336,18 @@ async def message_endpoint(payload: MessagePayload, request: Request):
             "message": payload.message,
             "locale": payload.locale,
         }
-        result = graph.invoke(
+        # Run the (sync) graph in a worker thread so the OpenAI round-trips don't stall the event loop
+        result = await asyncio.to_thread(
+            graph.invoke,
             inputs,
-            config={
+            {
                 "configurable": {
                     "thread_id": payload.user_id,
                 }
             },
         )
         # Normalize result to dict
-        if hasattr(result, "model_dump"):
-            data = result.model_dump()
-        elif isinstance(result, dict):
-            data = result
-        else:  # best-effort
-            try:
-                data = dict(result)
-            except Exception:
-                data = {"answer": str(result)}
+        data = _result_to_dict(result)
 
         # Post-process: ensure KnowledgeAgent has structured sources when meta.source_urls exist
         try:
@@ -241,16 +377,16 @@ async def message_endpoint(payload: MessagePayload, request: Request):
             agent_used = data.get("agent", "Unknown")
             route_trace = data.get("routing_history") or []
 
-            # Update user contextual memory
+            # Update user contextual memory (background writer, off the event loop)
             try:
-                update_user_context(
+                schedule_user_context_update(
                     user_id=session_id,
                     message=payload.message,
                     agent=agent_used,
                     response=assistant_answer
                 )
             except Exception as e:
-                print(f"Warning: Failed to update user context: {e}")
+                logger.warning("Failed to update user context: %s", e)
 
             msg = {
                 "id": f"msg_{int(time.time()*1000)}",
@@ -271,11 +407,11 @@ async def message_endpoint(payload: MessagePayload, request: Request):
                     await dbmod.save_message(msg)
 
                 except Exception as e:
-                    print(f"Error saving message or updating context: {e}")
+                    logger.error("Error saving message: %s", e)
             else:
                 _conversations.setdefault(session_id, []).append({k: v for k, v in msg.items() if k != "session_id"})
         except Exception as e:
-            print(f"Error in message persistence: {e}")
+            logger.error("Error in message persistence: %s", e)
 
         return {
             "ok": True,
@@ -303,7 +439,7 @@ async def generate_streaming_response(payload: MessagePayload, request: Request)
     # Rate limiting
     client_host = request.client.host if request.client is not None else "anonymous"
     user_key = payload.user_id or client_host
-    if not _allow_request(user_key):
+    if not await _allow_request(user_key):
         yield f"data: {json.dumps({'error': 'Rate limit exceeded'})}\n\n"
         return
 
@@ -339,15 +475,7 @@ async def generate_streaming_response(payload: MessagePayload, request: Request)
         result = await invoke_task
 
         # Normalize result
-        if hasattr(result, "model_dump"):
-            data = result.model_dump()
-        elif isinstance(result, dict):
-            data = result
-        else:
-            try:
-                data = dict(result)
-            except Exception:
-                data = {"answer": str(result)}
+        data = _result_to_dict(result)
 
         # Ensure KnowledgeAgent has sources: prefer meta.source_urls, else parse from answer
         try:
@@ -1,6 +1,7 @@
+import logging
 from langgraph.graph import StateGraph, END, START, MessagesState, add_messages
 from langchain_core.runnables import RunnableConfig
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, RemoveMessage
 from langgraph.store.base import BaseStore
 from typing import Optional
 
@@ -10,12 +11,33 @@ from app.agents.knowledge.knowledge_node import knowledge_node, knowledge_next
 from app.agents.support import support_node
 from app.agents.personality import personality_node
 from app.agents.custom import custom_node
+from app.graph.prefetch import start_user_context_prefetch
+
+logger = logging.getLogger(__name__)
+
+# Short-term memory window kept in state; agents read at most the last 10 exchanges
+MAX_HISTORY_MESSAGES = 20
+
+
+def _append_capped(existing_messages, message):
+    """
+    `messages` update appending `message` and dropping the oldest overflow.
+
+    The add_messages reducer merges updates into state, so overflow has to be
+    removed explicitly with RemoveMessage rather than by returning a slice.
+    """
+    overflow = len(existing_messages) + 1 - MAX_HISTORY_MESSAGES
+    removals = [RemoveMessage(id=m.id) for m in existing_messages[:max(0, overflow)] if m.id]
+    return removals + [message]
 
 
 def add_user_message(state):
     """
     Add user message to conversation history and preserve existing history.
     """
+    # Start loading user context now so it overlaps with routing and the agent's work
+    start_user_context_prefetch(state.get("user_id"))
+
     # Get existing messages or start with empty list
     existing_messages = state.get("messages", [])
 
@@ -25,7 +47,7 @@ def add_user_message(state):
     # Clear per-turn/volatile fields to prevent stale data from previous turn
     # This avoids repeating the last answer when the route changes (e.g., to personality)
     cleared_state = {
-        "messages": existing_messages + [user_message],
+        "messages": _append_capped(existing_messages, user_message),
         "answer": None,
         "retrieval": None,
         "agent": None,
@@ -44,7 +66,7 @@ def add_ai_response(state):
         existing_messages = state.get("messages", [])
         ai_message = AIMessage(content=state["answer"])
         # Append AI message to existing history
-        return {"messages": existing_messages + [ai_message]}
+        return {"messages": _append_capped(existing_messages, ai_message)}
     return {}
 
 
@@ -131,7 +153,7 @@ def enhanced_personality_with_memory(state, config: RunnableConfig, *, store: Ba
             "long_term_memory": memory_context,
             "memory_available": True
         }
-        print("📋 Personality agent enhanced with long-term memory")
+        logger.debug("Personality agent enhanced with long-term memory")
 
     # Process with personality agent
     result = personality_node(enhanced_state)
@@ -1,13 +1,30 @@
-from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
 from app.settings import settings
 from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.runnables import RunnableConfig
 from langgraph.store.base import BaseStore
 import uuid
 
+logger = logging.getLogger(__name__)
+
 # Global instances
 _checkpointer: Optional[object] = None
 _memory_store: Optional[object] = None
+
+# Short-lived per-user cache of rendered context prompts: prefetch, router and agents
+# all read the prompt within one turn. update_user_context invalidates the entry.
+_CONTEXT_PROMPT_TTL = 30.0
+_CONTEXT_PROMPT_MAX = 10_000
+_context_prompts: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_context_prompts_lock = threading.Lock()
+# Per-user invalidation stamp (from one global counter) so a write only blocks caching that user's reads
+_context_prompt_versions: "OrderedDict[str, int]" = OrderedDict()
+_context_prompt_counter = 0
 _postgres_available = False
 _postgres_saver_available = False
 
@@ -26,6 +43,31 @@ except ImportError:
     _postgres_saver_available = False
     PostgresSaver = None
 
+@dataclass(slots=True)
+class UserContext:
+    """User context used to personalise replies: DB background plus long-term memory."""
+    basic: str = ""
+    long_term: str = ""
+
+    @classmethod
+    def from_state(cls, user_context: Any, basic: str = "") -> "UserContext":
+        """Normalise state["user_context"] (dict, str or None) once."""
+        if isinstance(user_context, dict):
+            return cls(basic=basic, long_term=user_context.get("long_term_memory") or "")
+        if isinstance(user_context, str):
+            return cls(basic=basic, long_term=user_context)
+        return cls(basic=basic)
+
+    def to_prompt(self) -> str:
+        """Render the context as a single prompt line ("" when empty)."""
+        context_parts = []
+        if self.basic:
+            context_parts.append(f"User background: {self.basic}")
+        if self.long_term:
+            context_parts.append(f"Recent conversation topics: {self.long_term}")
+        return " ".join(context_parts)
+
+
 def _ensure_sslmode(uri: str) -> str:
     """
     Ensure SSL mode is set for Supabase compatibility.
@@ -52,14 +94,14 @@ def get_langgraph_checkpointer():
     
     # Skip PostgreSQL attempts if DATABASE_URL is empty or not set
     if not db_url or db_url.strip() == "":
-        print("🔄 Using MemorySaver (no DATABASE_URL configured)")
+        logger.info("Using MemorySaver (no DATABASE_URL configured)")
         _checkpointer = MemorySaver()
         return _checkpointer
 
     # Try to use PostgresSaver for production persistence
     if _postgres_saver_available and PostgresSaver:
         try:
-            print("🔄 Attempting to initialize PostgresSaver for checkpoints...")
+            logger.info("Attempting to initialize PostgresSaver for checkpoints...")
             conn_string = _ensure_sslmode(db_url)
 
             # Try different initialization approaches
@@ -68,7 +110,7 @@ def get_langgraph_checkpointer():
             # First, try with connection pool if available
             try:
                 from psycopg_pool import ConnectionPool
-                print("🔄 Using ConnectionPool for better connection management...")
+                logger.debug("Using ConnectionPool for checkpoints")
                 pool = ConnectionPool(
                     conninfo=conn_string,
                     min_size=1,
@@ -77,7 +119,7 @@ def get_langgraph_checkpointer():
                 )
                 postgres_checkpointer = PostgresSaver(pool)
             except ImportError:
-                print("⚠️ psycopg_pool not available, trying direct connection...")
+                logger.warning("psycopg_pool not available, trying direct connection...")
                 # Fallback to direct connection
                 postgres_checkpointer = PostgresSaver.from_conn_string(conn_string)
 
@@ -93,15 +135,14 @@ def get_langgraph_checkpointer():
             if hasattr(_checkpointer, 'setup'):
                 _checkpointer.setup()  # Create tables if they don't exist
 
-            print("✅ PostgresSaver initialized successfully - checkpoints will persist!")
+            logger.info("PostgresSaver initialized - checkpoints will persist")
             return _checkpointer
         except Exception as e:
-            print(f"⚠️ PostgresSaver failed ({e}) - falling back to MemorySaver")
-            print("   💡 This is normal in development or if PostgreSQL dependencies are missing")
-            print("   💡 Check that 'langgraph-checkpoint-postgres' is installed")
+            # Normal in development or when 'langgraph-checkpoint-postgres' is missing
+            logger.warning("PostgresSaver failed (%s) - falling back to MemorySaver", e)
 
     # Fallback to in-memory for development or when Postgres is not available
-    print("🔄 Using MemorySaver (development mode or Postgres not available)")
+    logger.info("Using MemorySaver (development mode or Postgres not available)")
     _checkpointer = MemorySaver()
     return _checkpointer
 
@@ -119,18 +160,18 @@ def get_memory_store():
     
     # Skip PostgreSQL attempts if DATABASE_URL is empty or not set
     if not db_url or db_url.strip() == "":
-        print("🔄 Using in-memory storage for long-term memory (no DATABASE_URL configured)")
+        logger.info("Using in-memory storage for long-term memory (no DATABASE_URL configured)")
         _memory_store = {}
         return _memory_store
 
     if not _postgres_available or PostgresStore is None:
-        print("⚠️ PostgresStore not available - using in-memory storage for long-term memory")
-        print("   💡 Install 'langgraph' with PostgreSQL support for persistent long-term memory")
+        # Install 'langgraph' with PostgreSQL support for persistent long-term memory
+        logger.warning("PostgresStore not available - using in-memory storage for long-term memory")
         _memory_store = {}
         return _memory_store
 
     try:
-        print("🔄 Attempting to initialize PostgresStore for long-term memory...")
+        logger.info("Attempting to initialize PostgresStore for long-term memory...")
         conn_string = _ensure_sslmode(db_url)
 
         # Try different initialization approaches
@@ -139,7 +180,7 @@ def get_memory_store():
         # First, try with connection pool if available
         try:
             from psycopg_pool import ConnectionPool
-            print("🔄 Using ConnectionPool for memory store...")
+            logger.debug("Using ConnectionPool for memory store")
             pool = ConnectionPool(
                 conninfo=conn_string,
                 min_size=1,
@@ -148,7 +189,7 @@ def get_memory_store():
             )
             postgres_memory_store = PostgresStore(pool)
         except ImportError:
-            print("⚠️ psycopg_pool not available for memory store, trying direct connection...")
+            logger.warning("psycopg_pool not available for memory store, trying direct connection...")
             # Fallback to direct connection
             postgres_memory_store = PostgresStore.from_conn_string(conn_string)
 
@@ -164,12 +205,11 @@ def get_memory_store():
         if hasattr(_memory_store, 'setup'):
             _memory_store.setup()  # Create tables if they don't exist
 
-        print("✅ PostgresStore initialized successfully - long-term memory will persist!")
+        logger.info("PostgresStore initialized - long-term memory will persist")
         return _memory_store
     except Exception as e:
-        print(f"⚠️ Failed to initialize PostgresStore: {e}")
-        print("   💡 Using in-memory storage for long-term memory")
-        print("   💡 This is normal in development or if PostgreSQL is not accessible")
+        # Normal in development or when PostgreSQL is not accessible
+        logger.warning("Failed to initialize PostgresStore (%s) - using in-memory storage for long-term memory", e)
         _memory_store = {}
         return _memory_store
 
@@ -197,20 +237,20 @@ def store_user_memory(user_id: str, namespace: str, key: str, value: Dict[str, A
                 store.put(memory_key, key, value)
             except Exception as conn_error:
                 if "connection is closed" in str(conn_error):
-                    print("⚠️ PostgresStore connection closed, reinitializing...")
+                    logger.warning("PostgresStore connection closed, reinitializing...")
                     # Force reinitialization of memory store
                     global _memory_store
                     _memory_store = None
                     store = get_memory_store()
                     if not isinstance(store, dict):
                         store.put(memory_key, key, value)
-                        print("✅ Memory stored after reconnection")
+                        logger.info("Memory stored after reconnection")
                     else:
-                        print("⚠️ Fell back to in-memory storage")
+                        logger.warning("Fell back to in-memory storage")
                 else:
                     raise conn_error
     except Exception as e:
-        print(f"Warning: Failed to store user memory: {e}")
+        logger.warning("Failed to store user memory: %s", e)
 
 def retrieve_user_memory(user_id: str, namespace: str, key: str = None) -> Dict[str, Any]:
     """
@@ -258,13 +298,13 @@ def retrieve_user_memory(user_id: str, namespace: str, key: str = None) -> Dict[
                     return {memory.key: memory.value for memory in memories}
             except Exception as conn_error:
                 if "connection is closed" in str(conn_error):
-                    print("⚠️ PostgresStore connection closed during retrieval, reinitializing...")
+                    logger.warning("PostgresStore connection closed during retrieval, reinitializing...")
                     # Force reinitialization of memory store
                     global _memory_store
                     _memory_store = None
                     store = get_memory_store()
                     if isinstance(store, dict):
-                        print("⚠️ Fell back to in-memory storage")
+                        logger.warning("Fell back to in-memory storage")
                         return {}
                     else:
                         # Try again with new connection
@@ -283,7 +323,7 @@ def retrieve_user_memory(user_id: str, namespace: str, key: str = None) -> Dict[
                 else:
                     raise conn_error
     except Exception as e:
-        print(f"Warning: Failed to retrieve user memory: {e}")
+        logger.warning("Failed to retrieve user memory: %s", e)
         return {}
 
 def update_user_context(user_id: str, message: str, agent: str, response: str = None):
@@ -317,20 +357,58 @@ def update_user_context(user_id: str, message: str, agent: str, response: str =
 
         # Store updated context
         store_user_memory(user_id, "context", "current", context)
+        invalidate_user_context_prompt(user_id)
 
     except Exception as e:
-        print(f"Warning: Failed to update user context: {e}")
+        logger.warning("Failed to update user context: %s", e)
+
+def invalidate_user_context_prompt(user_id: str):
+    """Drop the cached context prompt for a user after their context changes."""
+    global _context_prompt_counter
+    with _context_prompts_lock:
+        _context_prompts.pop(user_id, None)
+        _context_prompt_counter += 1
+        _context_prompt_versions[user_id] = _context_prompt_counter
+        _context_prompt_versions.move_to_end(user_id)
+        while len(_context_prompt_versions) > _CONTEXT_PROMPT_MAX:
+            _context_prompt_versions.popitem(last=False)
+
 
 def get_user_context_prompt(user_id: str) -> str:
     """
     Generate contextual prompt enhancement based on user history.
 
+    Prompts are cached per user for _CONTEXT_PROMPT_TTL seconds.
+
     Args:
         user_id: User identifier
 
     Returns:
         Contextual prompt string to enhance LLM responses
     """
+    now = time.monotonic()
+    with _context_prompts_lock:
+        cached = _context_prompts.get(user_id)
+        if cached is not None and now - cached[0] < _CONTEXT_PROMPT_TTL:
+            _context_prompts.move_to_end(user_id)
+            return cached[1]
+        version = _context_prompt_versions.get(user_id)
+
+    prompt = _build_user_context_prompt(user_id)
+    if prompt is not None:
+        with _context_prompts_lock:
+            # Skip caching a read that may predate a concurrent write to this user's context
+            if version != _context_prompt_versions.get(user_id):
+                return prompt
+            _context_prompts[user_id] = (now, prompt)
+            _context_prompts.move_to_end(user_id)
+            while len(_context_prompts) > _CONTEXT_PROMPT_MAX:
+                _context_prompts.popitem(last=False)
+    return prompt or ""
+
+
+def _build_user_context_prompt(user_id: str) -> Optional[str]:
+    """Render the context prompt from memory; None when it could not be read."""
     try:
         context = retrieve_user_memory(user_id, "context", "current") or {}
 
@@ -360,8 +438,8 @@ def get_user_context_prompt(user_id: str) -> str:
         return " ".join(enhancements) if enhancements else ""
 
     except Exception as e:
-        print(f"Warning: Failed to generate context prompt: {e}")
-        return ""
+        logger.warning("Failed to generate context prompt: %s", e)
+        return None
 
 
 # ========== LONG-TERM MEMORY FUNCTIONS (Following LangGraph Docs) ==========
@@ -388,9 +466,9 @@ def store_user_memory(user_id: str, namespace: str, key: str, value: Dict[str, A
             # PostgresStore - use proper namespace tuple
             memory_namespace = (user_id, namespace)
             store.put(memory_namespace, key, value)
-            print(f"🧠 Stored long-term memory: {key} for user {user_id}")
+            logger.debug("Stored long-term memory: %s for user %s", key, user_id)
     except Exception as e:
-        print(f"Warning: Failed to store user memory: {e}")
+        logger.warning("Failed to store user memory: %s", e)
 
 
 def retrieve_user_memory(user_id: str, namespace: str, key: str = None) -> Dict[str, Any]:
@@ -446,7 +524,7 @@ def retrieve_user_memory(user_id: str, namespace: str, key: str = None) -> Dict[
                     return {}
 
     except Exception as e:
-        print(f"Warning: Failed to retrieve user memory: {e}")
+        logger.warning("Failed to retrieve user memory: %s", e)
         return {}
 
 
@@ -492,7 +570,7 @@ def search_user_memories(user_id: str, query: str, namespace: str = "memories",
                 return list(retrieve_user_memory(user_id, namespace).values())[:limit]
 
     except Exception as e:
-        print(f"Warning: Failed to search user memories: {e}")
+        logger.warning("Failed to search user memories: %s", e)
         return []
 
 
@@ -516,7 +594,7 @@ def store_conversation_memory(user_id: str, user_message: str, ai_response: str)
         store_user_memory(user_id, "memories", memory_key, {"data": str(memory_data)})
 
     except Exception as e:
-        print(f"Warning: Failed to store conversation memory: {e}")
+        logger.warning("Failed to store conversation memory: %s", e)
 
 
 def get_user_memory_context(user_id: str, query: str = None) -> str:
@@ -551,7 +629,7 @@ def get_user_memory_context(user_id: str, query: str = None) -> str:
             return ""
 
     except Exception as e:
-        print(f"Warning: Failed to get user memory context: {e}")
+        logger.warning("Failed to get user memory context: %s", e)
         return ""
 
 
@@ -578,13 +656,14 @@ def update_user_context(user_id: str, message: str, agent: str, response: str =
 
         # Store updated context
         store_user_memory(user_id, "context", "current", context)
+        invalidate_user_context_prompt(user_id)
 
         # Also store conversation memory
         if response:
             store_conversation_memory(user_id, message, response)
 
     except Exception as e:
-        print(f"Warning: Failed to update user context: {e}")
+        logger.warning("Failed to update user context: %s", e)
 
 
 # ========== MEMORY NODE FUNCTIONS FOR LANGGRAPH ==========
@@ -613,7 +692,7 @@ def retrieve_memory_node(state, config: RunnableConfig, *, store: BaseStore = No
 
         if memory_texts:
             memory_context = f"Previous relevant conversations: {'; '.join(memory_texts)}"
-            print(f"🧠 Retrieved {len(memories)} relevant memories for user {user_id}")
+            logger.debug("Retrieved %d relevant memories for user %s", len(memories), user_id)
             return {"user_context": {"long_term_memory": memory_context}}
 
     return {"user_context": {"long_term_memory": ""}}
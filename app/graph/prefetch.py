@@ -0,0 +1,113 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict
+import threading
+
+from app.graph import memory
+
+logger = logging.getLogger(__name__)
+
+# Background pool for user-context reads started at graph entry
+_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="UserContextPrefetch")
+_pending: Dict[str, Future] = {}
+_pending_lock = threading.Lock()
+
+# How long a consumer waits for an in-flight prefetch before giving up
+PREFETCH_TIMEOUT = 0.8
+
+# Background writer for post-response context updates; the semaphore bounds queued writes
+_update_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="UserContextUpdate")
+_update_slots = threading.BoundedSemaphore(64)
+
+
+def _forget_prefetch(user_id: str, future: Future) -> None:
+    with _pending_lock:
+        if _pending.get(user_id) is future:
+            del _pending[user_id]
+
+
+def start_user_context_prefetch(user_id: str) -> Future | None:
+    """
+    Start loading the user's context prompt in the background.
+
+    Called at graph entry so the DB read overlaps with routing and the agent's work.
+    A turn that starts while a read for the same user is in flight shares it.
+    Finished reads leave the pending map (their result is in the memory module's
+    prompt cache), so prefetches that are never consumed are not kept around.
+    """
+    if not user_id:
+        return None
+
+    with _pending_lock:
+        future = _pending.get(user_id)
+        if future is not None:
+            return future
+        future = _pending[user_id] = _prefetch_pool.submit(memory.get_user_context_prompt, user_id)
+    future.add_done_callback(lambda done: _forget_prefetch(user_id, done))
+    return future
+
+
+def get_prefetched_user_context(user_id: str, timeout: float = PREFETCH_TIMEOUT) -> str:
+    """
+    Return the prefetched context prompt for a user.
+
+    Falls back to a direct read (served from the prompt cache when a prefetch
+    already finished) when no prefetch is pending, and to "" when the prefetch
+    does not finish within `timeout` seconds.
+    """
+    if not user_id:
+        return ""
+
+    with _pending_lock:
+        future = _pending.pop(user_id, None)
+
+    if future is None:
+        return memory.get_user_context_prompt(user_id)
+
+    try:
+        return future.result(timeout=timeout) or ""
+    except FutureTimeoutError:
+        logger.warning("User context prefetch timed out for %s", user_id)
+        return ""
+    except Exception as e:
+        logger.warning("User context prefetch failed for %s: %s", user_id, e)
+        return ""
+
+
+def discard_prefetched_user_context(user_id: str) -> None:
+    """Forget a prefetch whose result is not needed this turn."""
+    with _pending_lock:
+        future = _pending.pop(user_id, None)
+    if future is not None:
+        future.cancel()
+
+
+def _run_user_context_update(user_id: str, message: str, agent: str, response: str | None) -> None:
+    try:
+        memory.update_user_context(user_id, message, agent, response)
+    except Exception as e:
+        logger.warning("Background user context update failed for %s: %s", user_id, e)
+    finally:
+        _update_slots.release()
+
+
+def schedule_user_context_update(user_id: str, message: str, agent: str, response: str | None = None) -> None:
+    """
+    Persist the turn's user context without blocking the response.
+
+    When too many writes are already queued the update runs inline, so a slow
+    store applies backpressure instead of growing an unbounded backlog.
+    """
+    if not user_id:
+        return
+
+    if not _update_slots.acquire(blocking=False):
+        memory.update_user_context(user_id, message, agent, response)
+        return
+
+    try:
+        _update_pool.submit(_run_user_context_update, user_id, message, agent, response)
+    except RuntimeError:
+        # Pool already shut down (interpreter exit) - write inline
+        _update_slots.release()
+        memory.update_user_context(user_id, message, agent, response)
@@ -21,6 +21,8 @@ class Settings(BaseSettings):
     # Token caps for KnowledgeAgent requests
     openai_max_tokens_knowledge: int | None = Field(default=None, alias="OPENAI_MAX_TOKENS_KNOWLEDGE")
     openai_max_tokens_knowledge_retry: int | None = Field(default=None, alias="OPENAI_MAX_TOKENS_KNOWLEDGE_RETRY")
+    # Max in-flight chat completions across all agents (app.agents.llm_pool)
+    openai_concurrency: int = Field(8, alias="OPENAI_CONCURRENCY")
 
     # Web search
     tavily_api_key: str | None = Field(default=None, alias="TAVILY_API_KEY")
@@ -46,11 +48,15 @@ class Settings(BaseSettings):
 
     # Rate limiting
     rate_limit_per_minute: int = Field(60, alias="RATE_LIMIT_PER_MINUTE")
+    # Optional Redis for limits shared across workers (needs the `redis` package)
+    redis_url: str | None = Field(default=None, alias="REDIS_URL")
 
     # Knowledge Agent Warm-up
     knowledge_warmup_enabled: bool = Field(True, alias="KNOWLEDGE_WARMUP_ENABLED")
     knowledge_warmup_async: bool = Field(True, alias="KNOWLEDGE_WARMUP_ASYNC")
     knowledge_warmup_on_first_query: bool = Field(True, alias="KNOWLEDGE_WARMUP_ON_FIRST_QUERY")
+    # Precompute embeddings for COMMON_QUERIES during warm-up (turn off for stub/dev backends)
+    knowledge_warmup_embeddings: bool = Field(True, alias="KNOWLEDGE_WARMUP_EMBEDDINGS")
 
     # Slack integration (CustomAgent)
     slack_bot_token: str | None = Field(default=None, alias="SLACK_BOT_TOKEN")
@@ -118,12 +124,24 @@ class Settings(BaseSettings):
     embedding_cache_ttl: int = Field(3600, alias="EMBEDDING_CACHE_TTL")
     llm_cache_ttl: int = Field(300, alias="LLM_CACHE_TTL")
     retriever_cache_ttl: int = Field(600, alias="RETRIEVER_CACHE_TTL")
+    retriever_idle_ttl: int = Field(300, alias="RETRIEVER_IDLE_TTL")
     general_cache_ttl: int = Field(300, alias="GENERAL_CACHE_TTL")
+    # Semantic answer cache for context-free personality replies (app.agents.semantic_cache)
+    semantic_cache_enabled: bool = Field(True, alias="SEMANTIC_CACHE_ENABLED")
+    semantic_cache_size: int = Field(512, alias="SEMANTIC_CACHE_SIZE")
+    semantic_cache_threshold: float = Field(0.95, alias="SEMANTIC_CACHE_THRESHOLD")
+    # Semantic cache of AI routing decisions (app.agents.router)
+    router_cache_enabled: bool = Field(True, alias="ROUTER_CACHE_ENABLED")
+    router_cache_size: int = Field(1024, alias="ROUTER_CACHE_SIZE")
+    router_cache_threshold: float = Field(0.92, alias="ROUTER_CACHE_THRESHOLD")
+    router_cache_ttl: int = Field(3600, alias="ROUTER_CACHE_TTL")
 
     # Retrieval Orchestrator Configuration
     retrieval_max_workers: int = Field(4, alias="RETRIEVAL_MAX_WORKERS")
     enable_parallel_retrieval: bool = Field(True, alias="ENABLE_PARALLEL_RETRIEVAL")
     query_complexity_threshold: int = Field(10, alias="QUERY_COMPLEXITY_THRESHOLD")
+    query_length_threshold: int = Field(64, alias="QUERY_LENGTH_THRESHOLD")
+    use_query_complexity_heuristic: bool = Field(False, alias="USE_QUERY_COMPLEXITY_HEURISTIC")
 
     # Context Builder Configuration
     rag_min_chars_faq: int = Field(600, alias="RAG_MIN_CHARS_FAQ")
@@ -4,6 +4,10 @@ from typing import Dict, Any
 _tickets: Dict[str, Dict[str, Any]] = {}
 
 
+class TicketBackendError(RuntimeError):
+    """The ticketing backend could not create or read a ticket."""
+
+
 def open_ticket(user_id: str, category: str, summary: str) -> Dict[str, Any]:
     ticket_id = f"T-{len(_tickets)+1:05d}"
     _tickets[ticket_id] = {
@@ -1,6 +1,10 @@
 from typing import Dict, Any
 
 
+class ProfileUnavailable(RuntimeError):
+    """The profile store could not return a profile for the user."""
+
+
 def get_user_info(user_id: str) -> Dict[str, Any]:
     # Simulated user profile store
     # In a real app, replace with DB/HTTP call
@@ -36,6 +36,7 @@ def pytest_configure(config):
     os.environ.setdefault("LOG_LEVEL", "WARNING")  # Reduce log noise in tests
     os.environ.setdefault("KNOWLEDGE_CACHE_TTL", "0")  # Disable cache in tests
     os.environ.setdefault("RAG_WARMUP_ON_START", "false")  # Disable warmup in tests
+    os.environ.setdefault("KNOWLEDGE_WARMUP_ENABLED", "false")  # No knowledge warm-up on app startup
     os.environ.setdefault("MIN_ANSWER_LENGTH", "20")  # Lower threshold for tests
     os.environ.setdefault("RAG_VECTOR_K", "2")  # Reduce retrieval size in tests
     os.environ.setdefault("RAG_MAX_CONTEXT_CHARS", "1000")  # Smaller context for tests
\ No newline at end of file
@@ -44,3 +44,13 @@ def test_custom_agent_posts_slack_by_default():
     out = custom_node({"user_id": "u1", "message": "ping team"})
     assert out["agent"] == "CustomAgent"
     assert out["grounding"]["mode"] == "slack"
+
+
+def test_custom_agent_reuses_router_context(monkeypatch):
+    reads = []
+    monkeypatch.setattr(custom_module, "get_user_context_prompt", lambda user_id: reads.append(user_id) or "")
+    monkeypatch.setattr(custom_module, "schedule_user_context_update", lambda *args, **kwargs: None)
+
+    out = custom_node({"user_id": "u1", "message": "ping team", "user_context": "User's name is Ana."})
+    assert out["agent"] == "CustomAgent"
+    assert reads == []
@@ -0,0 +1,32 @@
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+
+class HistoryState(MessagesState):
+    message: str
+    answer: str
+
+
+def test_stored_history_is_capped(monkeypatch):
+    from app.graph import builder
+
+    monkeypatch.setattr(builder, "MAX_HISTORY_MESSAGES", 3)
+    monkeypatch.setattr(builder, "start_user_context_prefetch", lambda user_id: None)
+
+    g = StateGraph(HistoryState)
+    g.add_node("add_user_message", builder.add_user_message)
+    g.add_node("agent", lambda state: {"answer": f"re: {state['message']}"})
+    g.add_node("add_ai_response", builder.add_ai_response)
+    g.add_edge(START, "add_user_message")
+    g.add_edge("add_user_message", "agent")
+    g.add_edge("agent", "add_ai_response")
+    g.add_edge("add_ai_response", END)
+    graph = g.compile(checkpointer=MemorySaver())
+
+    config = {"configurable": {"thread_id": "history"}}
+    for i in range(4):
+        graph.invoke({"message": f"m{i}"}, config)
+
+    # The checkpointed state, not just the node output, keeps only the newest messages
+    stored = graph.get_state(config).values["messages"]
+    assert [m.content for m in stored] == ["re: m2", "m3", "re: m3"]
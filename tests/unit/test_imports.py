@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def test_knowledge_package_import_is_lazy():
+    """Importing the package must not pull in any heavy sub-module."""
+    code = (
+        "import sys, app.agents.knowledge; "
+        "print(sorted(m for m in sys.modules if m.startswith('app.agents.knowledge.')))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_imports():
+    pytest.importorskip("langchain_core")
+    import app.agents.knowledge as knowledge
+
+    assert callable(knowledge.knowledge_next)
+    assert knowledge.CacheManager.__name__ == "CacheManager"
+    assert knowledge.AsyncRetrievalOrchestrator.__name__ == "AsyncRetrievalOrchestrator"
+    assert knowledge.ContextBuilder.__name__ == "ContextBuilder"
+    assert knowledge.LangSmithProfiler.__name__ == "LangSmithProfiler"
+
+
+def test_retrieval_goes_through_orchestrator():
+    pytest.importorskip("langchain_core")
+    import app.agents.knowledge as knowledge
+
+    assert knowledge.get_orchestrator().__class__ is knowledge.AsyncRetrievalOrchestrator
+    assert callable(knowledge.orchestrate_retrieval)
+    with pytest.raises(AttributeError):
+        knowledge.RetrievalHandler
+
+
+def test_warmup_import_has_no_side_effects():
+    """Warm-up runs from the API startup hook, never as an import side effect."""
+    code = (
+        "import sys, app.agents.knowledge.warmup; "
+        "print('app.rag.vectorstore_milvus' in sys.modules, 'app.rag.embeddings' in sys.modules)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False False"
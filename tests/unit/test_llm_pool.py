@@ -0,0 +1,78 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.agents import llm_pool
+
+
+def _fake_client(create):
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def _rate_limit_error():
+    response = httpx.Response(429, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_chat_retries_on_rate_limit(monkeypatch):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) < 3:
+            raise _rate_limit_error()
+        return "ok"
+
+    monkeypatch.setattr(llm_pool, "_semaphore", None)
+    monkeypatch.setattr(llm_pool, "_backoff_delay", lambda attempt: 0)
+
+    assert llm_pool.chat(_fake_client(create), model="m", messages=[]) == "ok"
+    assert len(calls) == 3
+    assert calls[0]["model"] == "m"
+
+
+def test_chat_gives_up_after_max_retries(monkeypatch):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        raise _rate_limit_error()
+
+    monkeypatch.setattr(llm_pool, "_semaphore", None)
+    monkeypatch.setattr(llm_pool, "_backoff_delay", lambda attempt: 0)
+
+    with pytest.raises(openai.RateLimitError):
+        llm_pool.chat(_fake_client(create), model="m", messages=[])
+    assert len(calls) == llm_pool.MAX_RETRIES + 1
+
+
+def test_chat_caps_concurrency(monkeypatch):
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def create(messages, **kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        return messages[0]["content"]
+
+    monkeypatch.setattr(llm_pool, "_semaphore", None)
+    from app.settings import settings
+    monkeypatch.setattr(settings, "openai_concurrency", 2)
+
+    client = _fake_client(create)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda i: llm_pool.chat(client, messages=[{"role": "user", "content": str(i)}]), range(6)))
+
+    assert results == [str(i) for i in range(6)]
+    assert peak == 2
@@ -11,3 +11,169 @@ def test_personality_prefix_pt():
     state = {"answer": "Oi", "locale": "pt-BR"}
     out = personality_node(state)
     assert out["answer"].startswith("[pt-BR]")
+
+
+def test_personality_reuses_one_openai_client(monkeypatch):
+    from app.agents import personality as personality_module
+    from app.settings import settings
+
+    built = []
+    http_clients = []
+
+    class FakeOpenAI:
+        def __init__(self, api_key=None, **kwargs):
+            built.append(api_key)
+            http_clients.append(kwargs.get("http_client"))
+
+    monkeypatch.setattr(personality_module, "OpenAI", FakeOpenAI)
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(personality_module, "_openai_client", None)
+
+    first = personality_module._get_client()
+    assert personality_module._get_client() is first
+    assert built == ["sk-test"]
+
+    import httpx
+    assert isinstance(http_clients[0], httpx.Client)
+
+
+def test_format_answer_drops_sources():
+    from app.agents.personality import _format_answer
+
+    assert _format_answer("  Hi there  ", "en") == "Hi there"
+    assert _format_answer("Answer \nSources: a\nSources: b", "en") == "Answer"
+
+
+def test_personality_factory_skips_context_when_answer_present(monkeypatch):
+    from app.agents import personality as personality_module
+
+    loaded = []
+    monkeypatch.setattr(personality_module, "_load_context_prompt", lambda state, user_id: loaded.append(user_id))
+    monkeypatch.setattr(personality_module, "schedule_user_context_update", lambda *args: None)
+
+    node = personality_module.make_personality_node()
+    out = node({"answer": "From knowledge", "user_id": "u1", "message": "hi"})
+    assert out["answer"] == "From knowledge"
+    assert loaded == []
+
+
+def test_personality_factory_without_llm_uses_fallback(monkeypatch):
+    from app.agents import personality as personality_module
+
+    monkeypatch.setattr(personality_module, "schedule_user_context_update", lambda *args: None)
+    node = personality_module.make_personality_node(use_context=False, use_llm=False)
+    out = node({"message": "oi", "locale": "pt-BR", "user_id": "u1"})
+    assert out["answer"] == "Olá! Como posso ajudar você hoje?"
+
+
+def test_system_template_only_substitutes_context():
+    from app.agents.personality import _SYSTEM_TMPL
+
+    with_ctx = _SYSTEM_TMPL.format(ctx="PREVIOUS CONVERSATIONS: meu nome é João")
+    without_ctx = _SYSTEM_TMPL.format(ctx="")
+    assert "PREVIOUS CONVERSATIONS: meu nome é João" in with_ctx
+    assert with_ctx.replace("PREVIOUS CONVERSATIONS: meu nome é João", "") == without_ctx
+
+
+def test_personality_sends_recent_history_with_roles(monkeypatch):
+    from types import SimpleNamespace
+
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    from app.agents import personality as personality_module
+
+    sent = {}
+
+    def create(**kwargs):
+        sent.update(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(personality_module, "_get_client", lambda: client)
+
+    history = [HumanMessage(content=f"u{i}") if i % 2 == 0 else AIMessage(content=f"a{i}") for i in range(14)]
+    history.append(HumanMessage(content="now"))
+    node = personality_module.make_personality_node(use_context=False)
+    assert node({"message": "now", "messages": history})["answer"] == "ok"
+
+    prior = sent["messages"][1:-1]
+    assert len(prior) == 10
+    assert prior[0] == {"role": "user", "content": "u4"}
+    assert prior[-1] == {"role": "assistant", "content": "a13"}
+    assert sent["messages"][-1] == {"role": "user", "content": "now"}
+
+
+def test_format_answer_is_memoized():
+    from app.agents.personality import _format_answer
+
+    _format_answer.cache_clear()
+    _format_answer("Olá! Como posso ajudar você hoje?", "pt-BR")
+    _format_answer("Olá! Como posso ajudar você hoje?", "pt-BR")
+    info = _format_answer.cache_info()
+    assert info.hits == 1 and info.misses == 1
+
+
+def test_fallback_answer_matches_locale():
+    from app.agents.personality import _fallback_answer
+
+    assert _fallback_answer("pt-BR").startswith("Olá")
+    assert _fallback_answer("PT").startswith("Olá")
+    assert _fallback_answer("pT-br").startswith("Olá")
+    assert _fallback_answer("en-US").startswith("Hello")
+    assert _fallback_answer(None).startswith("Hello")
+
+
+def test_user_context_normalises_state_values():
+    from app.graph.memory import UserContext
+
+    assert UserContext.from_state(None).to_prompt() == ""
+    assert UserContext.from_state({"long_term_memory": "pix"}).long_term == "pix"
+    assert UserContext.from_state("cards", basic="returning user").to_prompt() == (
+        "User background: returning user Recent conversation topics: cards"
+    )
+    assert not hasattr(UserContext(), "__dict__")
+
+
+def test_personality_reuses_reply_for_identical_payload(monkeypatch):
+    from types import SimpleNamespace
+
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    from app.agents import personality as personality_module
+    from app.agents.knowledge.cache_manager import get_cache_manager
+
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"reply {len(calls)}"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(personality_module, "_get_client", lambda: client)
+    get_cache_manager().clear()
+
+    history = [HumanMessage(content="oi"), AIMessage(content="Olá!"), HumanMessage(content="tudo bem?")]
+    node = personality_module.make_personality_node(use_context=False)
+    assert node({"message": "tudo bem?", "messages": history})["answer"] == "reply 1"
+    assert node({"message": "tudo bem?", "messages": history})["answer"] == "reply 1"
+    # A different history is a different payload
+    assert node({"message": "tudo bem?", "messages": history[1:]})["answer"] == "reply 2"
+    assert len(calls) == 2
+    get_cache_manager().clear()
+
+
+def test_personality_answers_bare_greeting_without_llm(monkeypatch):
+    from app.agents import personality as personality_module
+
+    def fail_client():
+        raise AssertionError("LLM should not be called for a bare greeting")
+
+    monkeypatch.setattr(personality_module, "_get_client", fail_client)
+    monkeypatch.setattr(personality_module, "schedule_user_context_update", lambda *args: None)
+
+    node = personality_module.make_personality_node(use_context=False)
+    out = node({"message": "Oi!", "user_id": "u1"})
+    assert out["answer"] == "Olá! Como posso ajudar você hoje?"
+    assert out["meta"]["template_shortcut"] is True
+    assert node({"message": "hello", "locale": "pt-BR"})["answer"].startswith("Olá")
+    assert node({"message": "Olá!"})["answer"] == node({"message": "ola"})["answer"] == out["answer"]
@@ -0,0 +1,117 @@
+import threading
+import time
+
+from app.graph import memory, prefetch
+
+
+def test_prefetched_context_is_returned(monkeypatch):
+    monkeypatch.setattr(memory, "get_user_context_prompt", lambda user_id: f"ctx for {user_id}")
+
+    prefetch.start_user_context_prefetch("u1")
+    assert prefetch.get_prefetched_user_context("u1") == "ctx for u1"
+    assert "u1" not in prefetch._pending
+
+
+def test_missing_prefetch_falls_back_to_direct_read(monkeypatch):
+    monkeypatch.setattr(memory, "get_user_context_prompt", lambda user_id: "direct")
+    assert prefetch.get_prefetched_user_context("nobody") == "direct"
+
+
+def test_slow_prefetch_times_out_to_empty(monkeypatch):
+    release = threading.Event()
+
+    def slow(user_id):
+        release.wait(2)
+        return "late"
+
+    monkeypatch.setattr(memory, "get_user_context_prompt", slow)
+    prefetch.start_user_context_prefetch("slow")
+    assert prefetch.get_prefetched_user_context("slow", timeout=0.01) == ""
+    release.set()
+
+
+def test_user_context_update_runs_in_background(monkeypatch):
+    release = threading.Event()
+    done = threading.Event()
+    calls = []
+
+    def slow_update(user_id, message, agent, response=None):
+        release.wait(2)
+        calls.append((user_id, message, agent, response))
+        done.set()
+
+    monkeypatch.setattr(memory, "update_user_context", slow_update)
+    prefetch.schedule_user_context_update("u1", "oi", "PersonalityAgent", "Olá!")
+    assert calls == []  # caller did not wait for the write
+
+    release.set()
+    assert done.wait(2)
+    assert calls == [("u1", "oi", "PersonalityAgent", "Olá!")]
+
+
+def test_context_prompt_is_cached_until_context_update(monkeypatch):
+    reads = []
+
+    def retrieve(user_id, namespace, key=None):
+        reads.append(user_id)
+        return {"user_name": "Ana", "interaction_count": len(reads)}
+
+    monkeypatch.setattr(memory, "retrieve_user_memory", retrieve)
+    monkeypatch.setattr(memory, "store_user_memory", lambda *args: None)
+    memory.invalidate_user_context_prompt("cached-user")
+
+    assert memory.get_user_context_prompt("cached-user") == "User's name is Ana."
+    assert memory.get_user_context_prompt("cached-user") == "User's name is Ana."
+    assert len(reads) == 1
+
+    memory.update_user_context("cached-user", "hi", "PersonalityAgent")
+    memory.get_user_context_prompt("cached-user")
+    assert len(reads) == 3  # one read for the update, one fresh prompt read
+
+
+def test_context_write_only_blocks_caching_for_that_user(monkeypatch):
+    reads = []
+    written_during_read = {}
+
+    def retrieve(user_id, namespace, key=None):
+        reads.append(user_id)
+        # Another turn's context write lands while this read is in flight
+        memory.invalidate_user_context_prompt(written_during_read.get(user_id, "someone-else"))
+        return {"user_name": "Ana"}
+
+    monkeypatch.setattr(memory, "retrieve_user_memory", retrieve)
+    memory.invalidate_user_context_prompt("reader")
+    memory.invalidate_user_context_prompt("self-writer")
+
+    memory.get_user_context_prompt("reader")
+    memory.get_user_context_prompt("reader")
+    assert reads.count("reader") == 1
+
+    written_during_read["self-writer"] = "self-writer"
+    memory.get_user_context_prompt("self-writer")
+    memory.get_user_context_prompt("self-writer")
+    assert reads.count("self-writer") == 2
+
+
+def test_prefetch_is_shared_while_in_flight_and_dropped_when_done(monkeypatch):
+    release = threading.Event()
+    reads = []
+
+    def slow(user_id):
+        reads.append(user_id)
+        release.wait(2)
+        return "ctx"
+
+    monkeypatch.setattr(memory, "get_user_context_prompt", slow)
+    first = prefetch.start_user_context_prefetch("busy")
+    assert prefetch.start_user_context_prefetch("busy") is first
+
+    # Never consumed (e.g. the turn short-circuited): the entry goes away once the read ends
+    release.set()
+    first.result(timeout=2)
+    for _ in range(200):  # the done-callback runs right after the result is published
+        if "busy" not in prefetch._pending:
+            break
+        time.sleep(0.01)
+    assert "busy" not in prefetch._pending
+    assert reads == ["busy"]
@@ -0,0 +1,248 @@
+import time
+
+from app.agents.knowledge.cache_manager import get_cache_manager
+from app.agents.knowledge.retrieval_orchestrator import AsyncRetrievalOrchestrator
+
+
+class FakeRetriever:
+    def __init__(self, docs=None):
+        self.docs = docs or ["doc"]
+        self.calls = 0
+
+    def invoke(self, question):
+        self.calls += 1
+        return list(self.docs)
+
+
+def test_retriever_resolved_once_and_reused():
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    fake = FakeRetriever()
+    cache_manager.set_retriever("vector_retriever_lazy", fake)
+
+    orchestrator = AsyncRetrievalOrchestrator()
+    result = orchestrator._execute_vector_sync("q1", 2, emb_shared=object())
+    assert result.success
+    assert orchestrator._retrievers["vector"] is fake
+
+    # Further queries use the instance attribute, not the cache manager chain
+    cache_manager.clear()
+    orchestrator._execute_vector_sync("q2", 2, emb_shared=object())
+    assert fake.calls == 2
+
+    orchestrator.reset_retrievers()
+    assert orchestrator._retrievers == {}
+
+
+def test_retrieval_result_is_slotted_and_picklable():
+    import pickle
+
+    from app.agents.knowledge.retrieval_orchestrator import RetrievalResult
+
+    ok = RetrievalResult(["d"], 1.0, 0.5)
+    failed = RetrievalResult([], 0.0, 0.0, "boom")
+    assert ok.success and not failed.success
+    assert not hasattr(ok, "__dict__")
+
+    restored = pickle.loads(pickle.dumps(failed))
+    assert restored == failed
+    assert restored.success is False
+
+
+def test_cache_set_prunes_expired_entries_only_when_full():
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    cache = cache_manager._general_cache
+    max_size = cache_manager._general_cache_size
+
+    cache_manager.set("stale", "x", "retrieval", ttl=0.0001)
+    time.sleep(0.001)
+    cache_manager.set("fresh", "y", "retrieval")
+    assert "retrieval:stale" in cache  # not full yet, no scan
+
+    for i in range(max_size - len(cache)):
+        cache_manager.set(f"k{i}", i, "retrieval")
+    cache_manager.set("overflow", "z", "retrieval")
+    assert "retrieval:stale" not in cache
+    assert len(cache) <= max_size
+    cache_manager.clear()
+
+
+def test_failed_retrieval_is_negatively_cached():
+    class BrokenRetriever:
+        calls = 0
+
+        def invoke(self, question):
+            BrokenRetriever.calls += 1
+            raise RuntimeError("milvus down")
+
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    orchestrator = AsyncRetrievalOrchestrator()
+    orchestrator._retrievers["faq"] = BrokenRetriever()
+
+    first = orchestrator._execute_faq_sync("outage", emb_shared=object())
+    second = orchestrator._execute_faq_sync("outage", emb_shared=object())
+    assert not first.success
+    assert second is first
+    assert BrokenRetriever.calls == 1
+    cache_manager.clear()
+
+
+def test_parallel_decision_uses_length_threshold():
+    orchestrator = AsyncRetrievalOrchestrator()
+    orchestrator._enable_parallel = True
+    orchestrator._use_complexity_heuristic = False
+    orchestrator._length_threshold = 20
+
+    assert not orchestrator._should_run_parallel("short one")
+    assert orchestrator._should_run_parallel("a question that is clearly long enough")
+
+
+def test_execute_parallel_skips_thread_pool_on_cache_hits():
+    from app.agents.knowledge.retrieval_orchestrator import RetrievalResult
+
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    vector_hit = RetrievalResult(["v"], 1.0, 0.0)
+    faq_hit = RetrievalResult(["f"], 1.0, 0.0)
+    cache_manager.set("vector:hot", vector_hit, "retrieval")
+    cache_manager.set("faq:hot", faq_hit, "retrieval")
+
+    orchestrator = AsyncRetrievalOrchestrator()
+    assert orchestrator.execute_parallel("hot", 2, emb_shared=object()) == (vector_hit, faq_hit)
+    assert orchestrator._thread_pool is None
+    cache_manager.clear()
+
+
+def test_concurrent_identical_queries_share_one_retrieval():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    release = threading.Event()
+
+    class SlowRetriever:
+        calls = 0
+
+        def invoke(self, question):
+            SlowRetriever.calls += 1
+            release.wait(2)
+            return ["doc"]
+
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    orchestrator = AsyncRetrievalOrchestrator()
+    orchestrator._retrievers["vector"] = SlowRetriever()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(orchestrator._execute_vector_sync, "same", 2, object()) for _ in range(4)]
+        while not orchestrator._inflight:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert SlowRetriever.calls == 1
+    assert all(r.docs == ["doc"] for r in results)
+    assert orchestrator._inflight == {}
+    cache_manager.clear()
+
+
+def test_execute_parallel_embeds_question_once():
+    from app.rag.embeddings import OptimizedCachedEmbeddings
+
+    class CountingEmbeddings:
+        calls = 0
+
+        def embed_query(self, text):
+            CountingEmbeddings.calls += 1
+            return [0.1, 0.2]
+
+    class EmbeddingRetriever:
+        def __init__(self, embedding):
+            self.embedding = embedding
+
+        def invoke(self, question):
+            self.embedding.embed_query(question)
+            return ["doc"]
+
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    emb = OptimizedCachedEmbeddings(CountingEmbeddings())
+    orchestrator = AsyncRetrievalOrchestrator()
+    orchestrator._retrievers["vector"] = EmbeddingRetriever(emb)
+    orchestrator._retrievers["faq"] = EmbeddingRetriever(emb)
+
+    vector_result, faq_result = orchestrator.execute_parallel("embed me once", 2, emb_shared=emb)
+    assert vector_result.success and faq_result.success
+    assert CountingEmbeddings.calls == 1
+    orchestrator.shutdown()
+    cache_manager.clear()
+
+
+def test_idle_retriever_is_revalidated_and_dropped_when_dead(monkeypatch):
+    from app.agents.knowledge import cache_manager as cache_manager_module
+
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    background = []
+    monkeypatch.setattr(cache_manager_module, "_submit_background", lambda func, *args: background.append((func, args)))
+
+    def failing_ping(retriever):
+        raise ConnectionError("connection reset")
+
+    stale = FakeRetriever()
+    cache_manager.set_retriever("vector_retriever_lazy", stale, idle_ttl=0.0001, validator=failing_ping)
+    time.sleep(0.001)
+    # The read is served right away; the ping runs in the background
+    assert cache_manager.get_retriever("vector_retriever_lazy") is stale
+    assert len(background) == 1
+    func, args = background.pop()
+    func(*args)
+    assert cache_manager.get_retriever("vector_retriever_lazy") is None
+
+    fresh = FakeRetriever()
+    cache_manager.set_retriever("vector_retriever_lazy", fresh, idle_ttl=60, validator=failing_ping)
+    assert cache_manager.get_retriever("vector_retriever_lazy") is fresh
+    cache_manager.clear()
+
+
+def test_orchestrator_re_resolves_idle_retriever():
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    old, new = FakeRetriever(), FakeRetriever()
+
+    orchestrator = AsyncRetrievalOrchestrator()
+    orchestrator._retriever_idle_ttl = 0.0001
+    orchestrator._retrievers["vector"] = old
+    orchestrator._retriever_last_used["vector"] = time.monotonic() - 1
+    cache_manager.set_retriever("vector_retriever_lazy", new)
+
+    orchestrator._execute_vector_sync("idle", 2, emb_shared=object())
+    assert new.calls == 1 and old.calls == 0
+    cache_manager.clear()
+
+
+def test_llm_responses_written_in_one_batch():
+    import asyncio
+
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    items = [("oi", "Olá!"), ("hello", "Hi!"), ("thanks", "You're welcome!")]
+
+    asyncio.run(cache_manager.aset_llm_responses(items))
+    assert [cache_manager.get_llm_response(p) for p, _ in items] == ["Olá!", "Hi!", "You're welcome!"]
+
+    asyncio.run(cache_manager.aset_llm_response("bye", "Tchau!"))
+    assert cache_manager.get_llm_response("bye") == "Tchau!"
+    cache_manager.clear()
+
+
+def test_embeddings_written_in_one_batch():
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+
+    cache_manager.set_embeddings({"a": [0.1], "b": [0.2]})
+    assert cache_manager.get_embedding("a") == [0.1]
+    assert cache_manager.get_embedding("b") == [0.2]
+    cache_manager.clear()
@@ -1,6 +1,16 @@
+import pytest
+
 from app.agents.router import router_node, route_decision
 
 
+@pytest.fixture(autouse=True)
+def _no_router_cache(monkeypatch):
+    # Keep routing tests independent of embeddings and of each other's decisions
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "router_cache_enabled", False)
+
+
 def test_router_sets_intent_knowledge():
     state = {"message": "What are the fees?", "user_id": "u"}
     out = router_node(state)
@@ -13,3 +23,207 @@ def test_router_sets_intent_support():
     out = router_node(state)
     assert out["intent"] == "support"
     assert route_decision(out) == "support"
+
+
+def test_router_system_prompt_reuses_cached_base():
+    from app.agents.prompts import _base_system_content, build_system_prompt
+
+    _base_system_content.cache_clear()
+    first = build_system_prompt("router", "pt-BR", "ctx A").content
+    second = build_system_prompt("router", "en", "ctx B").content
+    assert _base_system_content.cache_info().hits == 1
+    assert first.endswith("USER CONTEXT:\nctx A\n\nLANGUAGE: Respond in Brazilian Portuguese (pt-BR)")
+    assert second.endswith("USER CONTEXT:\nctx B\n\nLANGUAGE: Respond in English")
+
+
+def test_intelligent_routing_maps_agent_names(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.agents import router as router_module
+
+    reply = {}
+
+    def create(**kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply["text"]))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(router_module, "_get_routing_llm_client", lambda: client)
+
+    for text, expected in [
+        ("CustomerSupportAgent", "support"),
+        ("CustomAgent", "custom"),
+        ("PersonalityAgent", "personality"),
+        ("no idea", "knowledge"),
+    ]:
+        reply["text"] = text
+        assert router_module._intelligent_routing("can you help me?", "u")["target_agent"] == expected
+
+
+def test_routing_client_is_reused(monkeypatch):
+    from app.agents import router as router_module
+
+    built = []
+
+    class FakeOpenAI:
+        def __init__(self, api_key=None, **kwargs):
+            built.append(api_key)
+            self.http_client = kwargs.get("http_client")
+
+    monkeypatch.setattr(router_module, "OpenAI", FakeOpenAI)
+    monkeypatch.setattr(router_module.settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(router_module, "_routing_client", None)
+
+    first = router_module._get_routing_llm_client()
+    assert router_module._get_routing_llm_client() is first
+    assert built == ["sk-test"]
+    assert first.http_client is not None
+
+
+def test_context_free_system_message_is_shared():
+    from app.agents.prompts import create_agent_messages
+
+    first = create_agent_messages("router", "hi", locale="pt-BR")[0]
+    second = create_agent_messages("router", "oi", locale="pt")[0]
+    english = create_agent_messages("router", "hi", locale="en-US")[0]
+    with_context = create_agent_messages("router", "hi", locale="pt-BR", user_context="ctx")[0]
+
+    assert first is second
+    assert english is not first and english.content.endswith("Respond in English")
+    assert with_context is not first and "USER CONTEXT:\nctx" in with_context.content
+
+
+def test_intelligent_routing_keeps_system_prompt_static(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.agents import router as router_module
+
+    sent = {}
+
+    def create(**kwargs):
+        sent.update(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="KnowledgeAgent"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(router_module, "_get_routing_llm_client", lambda: client)
+
+    router_module._intelligent_routing("quais as taxas?", "u", context_prompt="User's name is Ana.")
+    first_system = sent["messages"][0]["content"]
+    assert [m["role"] for m in sent["messages"]] == ["system", "user"]
+    assert sent["messages"][-1]["content"].endswith("USER MESSAGE: quais as taxas?")
+    assert "User's name is Ana." in sent["messages"][-1]["content"]
+    assert sent["extra_body"] == {"prompt_cache_key": "router-v1"}
+    assert sent["max_tokens"] <= 16
+
+    # The system prompt carries no per-turn text, so it is an identical cacheable prefix
+    router_module._intelligent_routing("how do I get a card machine?", "u2", context_prompt="other user")
+    assert sent["messages"][0]["content"] == first_system
+    assert "USER CONTEXT" not in first_system
+
+
+def test_intelligent_router_reads_user_context_once(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.agents import router as router_module
+
+    reads = []
+
+    def create(**kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="SupportAgent"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(router_module, "_get_routing_llm_client", lambda: client)
+    monkeypatch.setattr(router_module, "get_user_context_prompt", lambda user_id: reads.append(user_id) or "")
+
+    out = router_module.intelligent_router_node({"message": "help", "user_id": "u1"})
+    assert out["current_route"] == "support"
+    assert reads == ["u1"]
+    assert isinstance(out["routing_history"][-1]["timestamp"], int)
+
+
+def test_intelligent_routing_reuses_semantic_cache_hit(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.agents import router as router_module
+    from app.agents.semantic_cache import SemanticCache
+
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="SupportAgent"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    vectors = {"my card was blocked": [1.0, 0.0], "my card got blocked": [0.99, 0.05], "what are the fees?": [0.0, 1.0]}
+    monkeypatch.setattr(router_module, "_get_routing_llm_client", lambda: client)
+    monkeypatch.setattr(router_module, "embed_for_cache", lambda text: vectors[text])
+    monkeypatch.setattr(router_module, "get_router_cache", lambda cache=SemanticCache(threshold=0.92): cache)
+    monkeypatch.setattr(router_module.settings, "router_cache_enabled", True)
+
+    first = router_module._intelligent_routing("my card was blocked", "u", context_prompt="")
+    paraphrase = router_module._intelligent_routing("my card got blocked", "u", context_prompt="")
+    assert first["target_agent"] == paraphrase["target_agent"] == "support"
+    assert "cache hit" in paraphrase["routing_reason"]
+    assert len(calls) == 1
+
+    # Returning users are bucketed apart, and unrelated messages still go to the LLM
+    router_module._intelligent_routing("my card got blocked", "u", context_prompt="User's name is Ana.")
+    router_module._intelligent_routing("what are the fees?", "u", context_prompt="")
+    assert len(calls) == 3
+
+
+def test_sync_router_overlaps_context_read_and_cache_embedding(monkeypatch):
+    import threading
+    from types import SimpleNamespace
+
+    from app.agents import router as router_module
+
+    both_started = threading.Barrier(2, timeout=2)
+
+    def context_prompt(user_id):
+        both_started.wait()
+        return ""
+
+    def embed(text):
+        both_started.wait()
+        return []
+
+    def create(**kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="SupportAgent"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(router_module, "get_user_context_prompt", context_prompt)
+    monkeypatch.setattr(router_module, "embed_for_cache", embed)
+    monkeypatch.setattr(router_module, "_get_routing_llm_client", lambda: client)
+    monkeypatch.setattr(router_module.settings, "router_cache_enabled", True)
+
+    out = router_module.intelligent_router_node({"message": "my card was blocked", "user_id": "u1"})
+    assert out["current_route"] == "support"
+
+
+def test_routing_history_is_capped(monkeypatch):
+    from app.agents import router as router_module
+
+    monkeypatch.setattr(router_module, "_get_routing_llm_client", lambda: None)
+    monkeypatch.setattr(router_module, "get_user_context_prompt", lambda user_id: "")
+
+    history = [{"decision": "knowledge", "n": i} for i in range(40)]
+    out = router_module.intelligent_router_node({"message": "hi", "user_id": "u", "routing_history": history})
+
+    assert len(out["routing_history"]) == router_module._ROUTING_HISTORY_MAX
+    assert out["routing_history"][0]["n"] == 40 - router_module._ROUTING_HISTORY_MAX + 1
+    assert len(history) == 40
+
+
+def test_bare_greetings_and_human_requests_skip_the_llm(monkeypatch):
+    from app.agents import router as router_module
+
+    def no_client():
+        raise AssertionError("routing LLM should not be called")
+
+    monkeypatch.setattr(router_module, "_get_routing_llm_client", no_client)
+
+    greeting = router_module._intelligent_routing("Oi!", "u", context_prompt="")
+    assert greeting["target_agent"] == "personality"
+    assert greeting["routing_reason"] == "keyword fast path"
+    assert greeting["routing_confidence"] == 0.95
+    assert router_module._intelligent_routing("atendente", "u", context_prompt="")["target_agent"] == "custom"
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+from app.agents.semantic_cache import SemanticCache
+
+
+def test_semantic_cache_hits_above_threshold_only():
+    cache = SemanticCache(capacity=4, threshold=0.95)
+    cache.store("personality:en", "hi", [1.0, 0.0], "Hello!")
+
+    assert cache.lookup("personality:en", [0.99, 0.05]) == "Hello!"
+    assert cache.lookup("personality:en", [0.5, 0.5]) is None
+    # Buckets never share answers
+    assert cache.lookup("personality:pt", [1.0, 0.0]) is None
+
+
+def test_semantic_cache_evicts_least_recently_used():
+    cache = SemanticCache(capacity=2, threshold=0.95)
+    cache.store("b", "a", [1.0, 0.0, 0.0], "A")
+    cache.store("b", "b", [0.0, 1.0, 0.0], "B")
+    assert cache.lookup("b", [1.0, 0.0, 0.0]) == "A"  # refresh "a"
+
+    cache.store("b", "c", [0.0, 0.0, 1.0], "C")
+    assert len(cache) == 2
+    assert cache.lookup("b", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("b", [1.0, 0.0, 0.0]) == "A"
+
+
+def test_personality_serves_similar_greeting_from_semantic_cache(monkeypatch):
+    from app.agents import personality as personality_module
+
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Olá! Tudo bem?"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    vectors = {"tudo bem?": [1.0, 0.0], "tudo bem??": [0.99, 0.01]}
+    monkeypatch.setattr(personality_module, "_get_client", lambda: client)
+    monkeypatch.setattr(personality_module, "_embed_message", lambda message: vectors[message])
+    monkeypatch.setattr(personality_module, "get_semantic_cache", lambda: cache)
+    cache = SemanticCache()
+    from app.agents.knowledge.cache_manager import get_cache_manager
+    get_cache_manager().clear()
+
+    node = personality_module.make_personality_node(use_context=False)
+    assert node({"message": "tudo bem?", "locale": "pt-BR"})["answer"] == "Olá! Tudo bem?"
+    assert node({"message": "tudo bem??", "locale": "pt-BR"})["answer"] == "Olá! Tudo bem?"
+    assert len(calls) == 1
+
+    # Turns with history may be personalised and bypass the cache
+    node({"message": "tudo bem??", "locale": "pt-BR", "messages": ["earlier", "tudo bem??"]})
+    assert len(calls) == 2
+
+
+def test_expired_entries_are_not_served(monkeypatch):
+    from app.agents import semantic_cache as semantic_cache_module
+
+    now = [100.0]
+    monkeypatch.setattr(semantic_cache_module.time, "monotonic", lambda: now[0])
+    cache = SemanticCache(threshold=0.9, ttl=60)
+    cache.store("router", "help", [1.0, 0.0], "support")
+
+    assert cache.lookup("router", [1.0, 0.0]) == "support"
+    now[0] += 61
+    assert cache.lookup("router", [1.0, 0.0]) is None
+    assert len(cache) == 0
+
+
+def test_freed_and_evicted_rows_are_reused_in_place(monkeypatch):
+    from app.agents import semantic_cache as semantic_cache_module
+
+    now = [100.0]
+    monkeypatch.setattr(semantic_cache_module.time, "monotonic", lambda: now[0])
+    cache = SemanticCache(capacity=2, threshold=0.9, ttl=60)
+    cache.store("router", "a", [1.0, 0.0, 0.0], "support")
+    cache.store("router", "b", [0.0, 1.0, 0.0], "knowledge")
+    cache.store("router", "c", [0.0, 0.0, 1.0], "custom")  # evicts "a" into its row
+    assert cache._buckets["router"].rows == 2
+
+    now[0] += 61
+    assert cache.lookup("router", [0.0, 0.0, 1.0]) is None  # expired best match is dropped
+    cache.store("router", "d", [1.0, 1.0, 0.0], "personality")
+    assert cache._buckets["router"].rows == 2
+    assert cache.lookup("router", [1.0, 1.0, 0.0]) == "personality"
+
+
+def test_buckets_do_not_block_each_other():
+    cache = SemanticCache(threshold=0.9)
+    cache.store("personality:en", "hi", [1.0, 0.0], "Hello!")
+    cache.store("router", "help", [0.0, 1.0], "support")
+
+    # A bucket busy in another thread leaves the others usable
+    with cache._buckets["router"].lock:
+        assert cache.lookup("personality:en", [1.0, 0.0]) == "Hello!"
+        cache.store("personality:pt", "oi", [1.0, 0.0], "Olá!")
+    assert cache.lookup("router", [0.0, 1.0]) == "support"
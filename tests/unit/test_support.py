@@ -35,3 +35,60 @@ def test_support_tools_invoked(monkeypatch):
     assert captured["profile_called_with"] == "u99"
     assert captured["ticket_called_with"][0] == "u99"
     assert out["grounding"]["mode"] == "tools"
+
+
+def test_support_reuses_router_context(monkeypatch):
+    reads = []
+    monkeypatch.setattr(support_module, "get_user_context_prompt", lambda user_id: reads.append(user_id) or "")
+    monkeypatch.setattr(support_module, "schedule_user_context_update", lambda *args, **kwargs: None)
+
+    out = support_node({
+        "user_id": "u1",
+        "message": "I can't sign in",
+        "locale": "en",
+        "user_context": "This is a returning user with multiple interactions.",
+    })
+
+    assert reads == []
+    assert out["answer"].startswith("Welcome back!")
+    assert out["agent"] == "CustomerSupportAgent"
+
+
+def test_support_replies_without_ticket_when_backend_fails(monkeypatch):
+    from app.tools.ticketing import TicketBackendError
+
+    def failing_open_ticket(user_id, category, summary):
+        raise TicketBackendError("backend down")
+
+    scheduled = []
+    monkeypatch.setattr(support_module, "open_ticket", failing_open_ticket)
+    monkeypatch.setattr(support_module, "schedule_user_context_update", lambda *args: scheduled.append(args))
+
+    out = support_node({"user_id": "u1", "message": "não consigo entrar", "locale": "pt-BR"})
+    assert out["agent"] == "CustomerSupportAgent"
+    assert out["answer"].startswith("Não consegui abrir um chamado")
+    assert out["meta"]["error"] == "ticket_backend"
+    assert scheduled == []
+
+
+def test_support_uses_one_user_id_and_opens_ticket_without_profile(monkeypatch):
+    from app.tools.user_profile import ProfileUnavailable
+
+    seen = {}
+
+    def unavailable_profile(user_id):
+        seen["profile"] = user_id
+        raise ProfileUnavailable("profile store down")
+
+    def fake_open_ticket(user_id, category, summary):
+        seen["ticket"] = user_id
+        return {"id": "T-00042"}
+
+    monkeypatch.setattr(support_module, "get_user_info", unavailable_profile)
+    monkeypatch.setattr(support_module, "open_ticket", fake_open_ticket)
+    monkeypatch.setattr(support_module, "schedule_user_context_update", lambda user_id, *args: seen.update(context=user_id))
+
+    out = support_node({"message": "my card is blocked", "locale": "en", "user_context": ""})
+    assert seen == {"profile": "unknown", "ticket": "unknown", "context": "unknown"}
+    assert out["meta"]["user_profile_status"] == "unknown"
+    assert [a["type"] for a in out["grounding"]["artifacts"]] == ["ticket"]
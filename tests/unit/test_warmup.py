@@ -0,0 +1,209 @@
+from app.agents.knowledge.cache_manager import get_cache_manager
+from app.agents.knowledge.warmup import COMMON_QUERIES, KnowledgeWarmup
+
+
+class BatchEmbeddings:
+    def __init__(self, fail_batch=False):
+        self.fail_batch = fail_batch
+        self.batch_calls = 0
+        self.query_calls = 0
+
+    def embed_documents(self, texts):
+        self.batch_calls += 1
+        if self.fail_batch:
+            raise RuntimeError("batch endpoint down")
+        return [[0.1, 0.2] for _ in texts]
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return [0.3, 0.4]
+
+
+def test_common_embeddings_use_one_batched_call():
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    emb = BatchEmbeddings()
+
+    assert KnowledgeWarmup()._warmup_common_embeddings(emb) == len(COMMON_QUERIES)
+    assert emb.batch_calls == 1 and emb.query_calls == 0
+    assert cache_manager.get_embedding(COMMON_QUERIES[0]) == [0.1, 0.2]
+
+    # Everything is cached now - no further provider calls
+    assert KnowledgeWarmup()._warmup_common_embeddings(emb) == 0
+    assert emb.batch_calls == 1
+    cache_manager.clear()
+
+
+def test_common_embeddings_fall_back_per_query():
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    emb = BatchEmbeddings(fail_batch=True)
+
+    assert KnowledgeWarmup()._warmup_common_embeddings(emb) == len(COMMON_QUERIES)
+    assert emb.query_calls == len(COMMON_QUERIES)
+    cache_manager.clear()
+
+
+def test_warmup_tasks_run_concurrently(monkeypatch):
+    import threading
+
+    from app.agents.knowledge import warmup as warmup_module
+
+    barrier = threading.Barrier(3, timeout=2)
+    thread_names = []
+
+    def fake_probe(kind, k, embeddings):
+        thread_names.append(threading.current_thread().name)
+        barrier.wait()
+        return f"{kind}-retriever"
+
+    def fake_common(embeddings):
+        thread_names.append(threading.current_thread().name)
+        barrier.wait()
+        return 0
+
+    monkeypatch.setattr(warmup_module, "_connect_and_probe", fake_probe)
+    monkeypatch.setattr(warmup_module, "_safe_common_embeddings", fake_common)
+
+    # All three steps must be in flight at the same time to pass the barrier
+    assert warmup_module._run_warmup_tasks(object()) == ("vector-retriever", "faq-retriever")
+    assert all(name.startswith("kb-warmup") for name in thread_names)
+
+
+def test_warmup_lazy_connects_only_needed_retriever(monkeypatch):
+    from app.agents.knowledge import warmup as warmup_module
+
+    connected = []
+
+    def fake_connect(kind, k, embeddings, probe=True):
+        connected.append((kind, probe))
+        return f"{kind}-retriever"
+
+    reset = []
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    cache_manager.set("embeddings", object(), "system")
+    monkeypatch.setattr(warmup_module, "_connect_and_probe", fake_connect)
+    monkeypatch.setattr(warmup_module, "_reset_orchestrator", reset.append)
+
+    warmup = KnowledgeWarmup()
+    warmup.warmup_lazy("maquininha smart")
+    assert connected == [("vector", False)]
+    assert reset == ["vector"]
+    assert cache_manager.get_retriever("vector_retriever_lazy") == "vector-retriever"
+    assert not warmup.is_warmed_up()
+
+    # Later questions for the same kind reuse the cached retriever
+    for _ in range(4):
+        warmup.warmup_lazy("maquininha smart")
+    assert connected == [("vector", False)]
+    assert reset == ["vector"]
+
+    warmup.warmup_lazy("como")
+    assert connected == [("vector", False), ("faq", False)]
+    assert reset == ["vector", "faq"]
+    assert warmup.is_warmed_up()
+    cache_manager.clear()
+
+
+def test_warmup_lazy_failed_connect_waits_for_cooldown(monkeypatch):
+    from app.agents.knowledge import warmup as warmup_module
+
+    connected = []
+
+    def failing_connect(kind, k, embeddings, probe=True):
+        connected.append(kind)
+        return None
+
+    cache_manager = get_cache_manager()
+    cache_manager.clear()
+    cache_manager.set("embeddings", object(), "system")
+    monkeypatch.setattr(warmup_module, "_connect_and_probe", failing_connect)
+
+    warmup = KnowledgeWarmup()
+    for _ in range(3):
+        warmup.warmup_lazy("maquininha smart")
+    assert connected == ["vector"]
+
+    monkeypatch.setattr(warmup_module, "LAZY_RETRY_COOLDOWN", 0.0)
+    warmup.warmup_lazy("maquininha smart")
+    assert connected == ["vector", "vector"]
+    cache_manager.clear()
+
+
+def test_warmup_lazy_mixed_question_warms_in_background(monkeypatch):
+    from app.agents.knowledge import warmup as warmup_module
+
+    started = []
+
+    def inline_connect(*args, **kwargs):
+        raise AssertionError("mixed questions must not connect on the request path")
+
+    monkeypatch.setattr(warmup_module, "initialize_warmup_system", lambda: started.append(True))
+    monkeypatch.setattr(warmup_module, "_connect_and_probe", inline_connect)
+
+    warmup = KnowledgeWarmup()
+    for _ in range(3):
+        warmup.warmup_lazy("como funciona o pix")
+    warmup._thread.join(timeout=2)
+    assert started == [True]
+
+
+def test_warmup_async_runs_as_task_on_running_loop(monkeypatch):
+    import asyncio
+
+    from app.agents.knowledge import warmup as warmup_module
+
+    ran = []
+
+    async def fake_warmup_all_async():
+        ran.append(asyncio.get_running_loop())
+
+    monkeypatch.setattr(warmup_module, "_warmup_all_async", fake_warmup_all_async)
+
+    async def main():
+        warmup = KnowledgeWarmup()
+        task = warmup.warmup_async()
+        assert isinstance(task, asyncio.Task)
+        assert warmup.get_warmup_status()["status"] == "in_progress"
+        await task
+        return asyncio.get_running_loop()
+
+    loop = asyncio.run(main())
+    assert ran == [loop]
+
+
+def test_warmup_instance_is_a_singleton():
+    from app.agents.knowledge.warmup import KnowledgeWarmup, get_warmup_instance
+
+    assert isinstance(get_warmup_instance(), KnowledgeWarmup)
+    assert get_warmup_instance() is get_warmup_instance()
+
+
+def test_common_embeddings_skipped_when_disabled(monkeypatch):
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "knowledge_warmup_embeddings", False)
+    emb = BatchEmbeddings()
+    assert KnowledgeWarmup()._warmup_common_embeddings(emb) == 0
+    assert emb.batch_calls == 0 and emb.query_calls == 0
+
+
+def test_failed_full_warmup_is_retried_after_cooldown(monkeypatch):
+    from app.agents.knowledge import warmup as warmup_module
+
+    started = []
+    # A full warm-up that connects nothing leaves the instance cold
+    monkeypatch.setattr(warmup_module, "initialize_warmup_system", lambda: started.append(True))
+
+    warmup = KnowledgeWarmup()
+    warmup.warmup_lazy("olá")
+    warmup._thread.join(timeout=2)
+    warmup.warmup_lazy("olá")
+    assert started == [True]
+
+    monkeypatch.setattr(warmup_module, "LAZY_RETRY_COOLDOWN", 0.0)
+    warmup.warmup_lazy("olá")
+    warmup._thread.join(timeout=2)
+    assert started == [True, True]
+    assert not warmup.is_warmed_up()